@@ -2,12 +2,20 @@ import os
 import subprocess
 import platform
 
+# The app never uses these, but the command line modules it shares import them on demand
+EXCLUDED_MODULES = ['pandas', 'numpy', 'pyarrow', 'tkinter']
+
 def build_executable():
+    # A one-folder build starts much faster than --onefile, which unpacks itself to a
+    # temporary folder on every launch; UPX-compressed libraries also slow loading down
+    options = '--onedir --windowed --noupx --name "Lab Results Parser" --paths ..'
+    options += ''.join(f' --exclude-module {module}' for module in EXCLUDED_MODULES)
+
     # Determine the command based on the platform
     if platform.system() == "Windows":
-        cmd = 'pyinstaller --onefile --windowed --name "Lab Results Parser" --icon=icon.ico lab_results_app.py'
+        cmd = f'pyinstaller {options} --icon=icon.ico lab_results_app.py'
     else:  # macOS, Linux
-        cmd = 'pyinstaller --onefile --windowed --name "Lab Results Parser" lab_results_app.py'
+        cmd = f'pyinstaller {options} lab_results_app.py'
     
     # Run the command
     subprocess.call(cmd, shell=True)
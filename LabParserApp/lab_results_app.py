@@ -1,117 +1,177 @@
 import sys
 import os
-import pandas as pd
-import re
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                             QHBoxLayout, QFileDialog, QLabel, QWidget, QProgressBar, 
-                            QMessageBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                            QMessageBox, QCheckBox, QTableWidget, QTableWidgetItem, 
+                            QHeaderView)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+
+# The parser core and export layer live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lab_export import export_results
+from lab_parser import iter_results, merge_specimens, parse_specimens, throttle_progress
+from parse_lab_results import expand_inputs
+
+# Seconds between checks for worker updates and cancellation while a batch runs
+POLL_INTERVAL = 0.1
+
+class ProcessingCancelled(Exception):
+    """Raised from a progress callback to stop the pipeline when the user cancels."""
+
+def process_queued_file(index, file_path, output_file, updates, cancel_event):
+    """Parse one queued file in a worker process, and export it there too if output_file is given.
+
+    Status updates are put on the updates queue as (index, status). Returns
+    the file's specimens_data, or its number of rows when it was exported.
+    """
+    def report_progress(position, total):
+        # Checked only as often as progress is reported, since the event lives in the manager process
+        if cancel_event.is_set():
+            raise ProcessingCancelled()
+        if position is not None:
+            # Compressed files report no position until they are done
+            updates.put((index, f'Parsing {int((position / total) * 100) if total else 100}%'))
+        
+    updates.put((index, 'Parsing'))
+    specimens_data = parse_specimens(file_path, progress=throttle_progress(report_progress))
+    if output_file is None:
+        return specimens_data
+        
+    updates.put((index, 'Saving'))
+    total = len(specimens_data)
+    
+    def report_saving(position, total):
+        updates.put((index, f'Saving {int((position / total) * 100) if total else 100}%'))
+        
+    throttled = throttle_progress(report_saving)
+    
+    def report_rows(count):
+        if cancel_event.is_set():
+            raise ProcessingCancelled()
+        throttled(count, total)
+        
+    try:
+        return export_results(iter_results(specimens_data), output_file, progress=report_rows)
+    except ProcessingCancelled:
+        # Don't leave a half-written file behind
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
 
 class ParserThread(QThread):
     progress_signal = pyqtSignal(int)
-    finished_signal = pyqtSignal(list)
+    status_signal = pyqtSignal(str)
+    file_status_signal = pyqtSignal(int, str)
+    file_count_signal = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(int, int)
+    cancelled_signal = pyqtSignal()
     error_signal = pyqtSignal(str)
     
-    def __init__(self, input_file):
+    def __init__(self, input_files, output_file=None, output_files=None):
+        """Process input_files into one merged output_file, or into output_files (one per input)."""
         super().__init__()
-        self.input_file = input_file
+        self.input_files = input_files
+        self.output_file = output_file
+        self.output_files = output_files
+        self.exporting = False
         
     def run(self):
+        # Parse and export both run off the UI thread, so the window stays responsive throughout
         try:
-            results = self.parse_lab_results(self.input_file)
-            self.finished_signal.emit(results)
+            results, failed = self.process_files()
+            if self.output_files:
+                count = sum(results.values())
+            else:
+                # Files are merged in input order, so duplicates follow the same first-seen rules as the CLI
+                specimens_data = {}
+                for index in sorted(results):
+                    merge_specimens(specimens_data, results[index])
+                count = self.export_results(specimens_data, self.output_file)
+            self.finished_signal.emit(count, failed)
+        except ProcessingCancelled:
+            # Don't leave a half-written workbook behind
+            if self.exporting and os.path.exists(self.output_file):
+                os.remove(self.output_file)
+            self.cancelled_signal.emit()
         except Exception as e:
             self.error_signal.emit(str(e))
-    
-    def parse_lab_results(self, file_path):
-        """Parse lab results from the text file and extract relevant information."""
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            content = file.read()
+            
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise ProcessingCancelled()
+            
+    def emit_progress(self, position, total):
+        self.progress_signal.emit(int((position / total) * 100) if total else 100)
         
-        # Create a dictionary to store all information by specimen ID
-        specimens_data = {}
+    def process_files(self):
+        """Parse the input files on a pool of worker processes, one file per worker at a time.
+
+        Returns ({index: result}, number of failed files).
+        """
+        self.status_signal.emit('Parsing...')
+        self.progress_signal.emit(0)
+        results = {}
+        failed = 0
+        workers = min(len(self.input_files), os.cpu_count() or 1)
+        with multiprocessing.Manager() as manager:
+            updates = manager.Queue()
+            cancel_event = manager.Event()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {}
+                for index, file_path in enumerate(self.input_files):
+                    output_file = self.output_files[index] if self.output_files else None
+                    future = pool.submit(process_queued_file, index, file_path, output_file, updates, cancel_event)
+                    futures[future] = index
+                    
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                    while not updates.empty():
+                        self.file_status_signal.emit(*updates.get())
+                        
+                    for future in done:
+                        index = futures[future]
+                        if future.cancelled():
+                            self.file_status_signal.emit(index, 'Cancelled')
+                            continue
+                        try:
+                            result = future.result()
+                        except ProcessingCancelled:
+                            self.file_status_signal.emit(index, 'Cancelled')
+                            continue
+                        except Exception as e:
+                            # One bad file doesn't stop the rest of the batch
+                            failed += 1
+                            self.file_status_signal.emit(index, f'Failed: {e}')
+                            continue
+                        results[index] = result
+                        self.file_status_signal.emit(index, 'Done')
+                        self.file_count_signal.emit(index, result if self.output_files else len(result))
+                        
+                    self.emit_progress(len(futures) - len(pending), len(futures))
+                    if self.isInterruptionRequested() and not cancel_event.is_set():
+                        cancel_event.set()
+                        for future in pending:
+                            future.cancel()
+                            
+        self.check_cancelled()
+        return results, failed
         
-        # Find all instances of specimen IDs (both SPEC #: and Specimen: formats)
-        specimen_matches = list(re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content))
-        total_matches = len(specimen_matches)
+    def export_results(self, specimens_data, output_file):
+        """Write the merged results to output_file, reporting progress by rows written."""
+        self.exporting = True
+        self.status_signal.emit('Saving...')
+        self.progress_signal.emit(0)
+        total = len(specimens_data)
+        throttled = throttle_progress(self.emit_progress)
         
-        for i, match in enumerate(specimen_matches):
-            # Update progress
-            self.progress_signal.emit(int((i / total_matches) * 100))
+        def report_progress(count):
+            self.check_cancelled()
+            throttled(count, total)
             
-            sample_id = match.group(1)
-            start_pos = match.start()
-            
-            # If this is the first time we see this specimen ID, initialize its data
-            if sample_id not in specimens_data:
-                specimens_data[sample_id] = {
-                    'run_date': "Unknown",
-                    'age_sex': "Unknown",
-                    'comp_date_time': "Unknown",
-                    'detected_tests': []
-                }
-                
-            # Extract section from this match to the next one (or end of file)
-            section_end = len(content)
-            for other_match in re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content[start_pos + 1:]):
-                section_end = start_pos + 1 + other_match.start()
-                break
-                
-            section = content[start_pos:section_end]
-            
-            # Find RUN DATE near this specimen
-            run_date_match = re.search(r'RUN DATE:\s*(\S+)', content[max(0, start_pos-1000):start_pos])
-            if not run_date_match:
-                run_date_match = re.search(r'RUN DATE:\s*(\S+)', section)
-                
-            if run_date_match and specimens_data[sample_id]['run_date'] == "Unknown":
-                specimens_data[sample_id]['run_date'] = run_date_match.group(1)
-                
-            # Extract Age/Sex
-            age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', content[max(0, start_pos-1000):start_pos])
-            if not age_sex_match:
-                age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', section)
-                
-            if age_sex_match and specimens_data[sample_id]['age_sex'] == "Unknown":
-                specimens_data[sample_id]['age_sex'] = age_sex_match.group(1)
-                
-            # Extract Completion Date/Time
-            comp_match = re.search(r'COMP:\s*(\S+)', section)
-            if comp_match and specimens_data[sample_id]['comp_date_time'] == "Unknown":
-                specimens_data[sample_id]['comp_date_time'] = comp_match.group(1)
-                
-            # Find detected tests in this section
-            lines = section.split('\n')
-            for i in range(len(lines) - 1):
-                line = lines[i].strip()
-                
-                # Check if this is a test result line (contains "Final")
-                if "Final" in line and not line.startswith("---"):
-                    # Extract the test name (everything before "Final")
-                    test_name = line.split("Final")[0].strip()
-                    
-                    # Get the next line which should contain the result
-                    result_line = lines[i+1].strip() if i+1 < len(lines) else ""
-                    
-                    # Check if the result is "Detected" (but not "Not Detected")
-                    if "Detected" in result_line and "Not Detected" not in result_line:
-                        specimens_data[sample_id]['detected_tests'].append(test_name)
-        
-        # Convert the dictionary to the list of results
-        results = []
-        for sample_id, data in specimens_data.items():
-            # Create result entry
-            result = {
-                "Date": data['run_date'],
-                "Sample ID #": sample_id,
-                "Age": data['age_sex'],
-                "COMP DATE-Time": data['comp_date_time'],
-                "Result": "Not detected" if not data['detected_tests'] else "; ".join([f"{test}: Detected" for test in data['detected_tests']])
-            }
-            results.append(result)
-        
-        self.progress_signal.emit(100)
-        return results
+        return export_results(iter_results(specimens_data), output_file, progress=report_progress)
 
 class LabResultsApp(QMainWindow):
     def __init__(self):
@@ -121,7 +181,7 @@ class LabResultsApp(QMainWindow):
     def initUI(self):
         # Set window properties
         self.setWindowTitle('Lab Results Parser')
-        self.setGeometry(100, 100, 600, 300)
+        self.setGeometry(100, 100, 700, 500)
         
         # Main widget and layout
         main_widget = QWidget()
@@ -131,11 +191,14 @@ class LabResultsApp(QMainWindow):
         
         # Input file selection
         input_layout = QHBoxLayout()
-        self.input_label = QLabel('No file selected')
-        self.input_button = QPushButton('Select Input File')
-        self.input_button.clicked.connect(self.select_input_file)
+        self.input_label = QLabel('No files selected')
+        self.input_button = QPushButton('Select Input Files')
+        self.input_button.clicked.connect(self.select_input_files)
+        self.folder_button = QPushButton('Select Input Folder')
+        self.folder_button.clicked.connect(self.select_input_folder)
         input_layout.addWidget(self.input_label)
         input_layout.addWidget(self.input_button)
+        input_layout.addWidget(self.folder_button)
         main_layout.addLayout(input_layout)
         
         # Output file selection
@@ -147,16 +210,34 @@ class LabResultsApp(QMainWindow):
         output_layout.addWidget(self.output_button)
         main_layout.addLayout(output_layout)
         
+        # Merged or per-file output
+        self.per_file_checkbox = QCheckBox('Save one workbook per input file')
+        self.per_file_checkbox.toggled.connect(self.clear_output)
+        main_layout.addWidget(self.per_file_checkbox)
+        
+        # Per-file status table
+        self.file_table = QTableWidget(0, 3)
+        self.file_table.setHorizontalHeaderLabels(['File', 'Status', 'Specimens'])
+        self.file_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.file_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        main_layout.addWidget(self.file_table)
+        
         # Progress bar
         self.progress_bar = QProgressBar()
         main_layout.addWidget(self.progress_bar)
         
         # Parse button
-        self.parse_button = QPushButton('Process File')
+        self.parse_button = QPushButton('Process Files')
         self.parse_button.clicked.connect(self.process_file)
         self.parse_button.setEnabled(False)
         main_layout.addWidget(self.parse_button)
         
+        # Cancel button
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        self.cancel_button.setEnabled(False)
+        main_layout.addWidget(self.cancel_button)
+        
         # Status label
         self.status_label = QLabel('Ready')
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -165,95 +246,174 @@ class LabResultsApp(QMainWindow):
         # Help text
         help_text = """
         How to use:
-        1. Click 'Select Input File' to choose your lab results text file
-        2. Click 'Select Output Location' to choose where to save the Excel file
-        3. Click 'Process File' to extract the lab results
+        1. Select one or more lab results text files, or a folder of them
+        2. Click 'Select Output Location' to choose the Excel file (or, for one workbook per file, the folder)
+        3. Click 'Process Files' to extract the lab results
         """
         help_label = QLabel(help_text)
         help_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(help_label)
         
         # Initialize variables
-        self.input_file = None
+        self.input_files = []
         self.output_file = None
         
-    def select_input_file(self):
+    def select_input_files(self):
         file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getOpenFileName(self, 'Select Lab Results Text File', '', 'Text Files (*.txt)')
+        file_paths, _ = file_dialog.getOpenFileNames(self, 'Select Lab Results Text Files', '', 'Reports (*.txt *.txt.gz *.txt.xz *.txt.bz2 *.zip);;Text Files (*.txt)')
         
-        if file_path:
-            self.input_file = file_path
-            self.input_label.setText(os.path.basename(file_path))
-            self.check_enable_parse()
+        if file_paths:
+            self.set_input_files(file_paths)
             
-    def select_output_file(self):
-        file_dialog = QFileDialog()
-        file_path, _ = file_dialog.getSaveFileName(self, 'Save Excel File', '', 'Excel Files (*.xlsx)')
+    def select_input_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, 'Select Folder of Lab Results Text Files')
         
-        if file_path:
-            if not file_path.endswith('.xlsx'):
+        if folder:
+            file_paths = expand_inputs([folder])
+            if not file_paths:
+                QMessageBox.warning(self, 'No Files', 'The folder contains no report files.')
+                return
+            self.set_input_files(file_paths)
+            
+    def set_input_files(self, file_paths):
+        self.input_files = file_paths
+        if len(file_paths) == 1:
+            self.input_label.setText(os.path.basename(file_paths[0]))
+        else:
+            self.input_label.setText(f'{len(file_paths)} files selected')
+            
+        # One row per queued file
+        self.file_table.setRowCount(len(file_paths))
+        for row, file_path in enumerate(file_paths):
+            self.file_table.setItem(row, 0, QTableWidgetItem(os.path.basename(file_path)))
+            self.file_table.setItem(row, 1, QTableWidgetItem('Queued'))
+            self.file_table.setItem(row, 2, QTableWidgetItem(''))
+        self.check_enable_parse()
+        
+    def select_output_file(self):
+        if self.per_file_checkbox.isChecked():
+            file_path = QFileDialog.getExistingDirectory(self, 'Select Folder for Excel Files')
+        else:
+            file_dialog = QFileDialog()
+            file_path, _ = file_dialog.getSaveFileName(self, 'Save Excel File', '', 'Excel Files (*.xlsx)')
+            if file_path and not file_path.endswith('.xlsx'):
                 file_path += '.xlsx'
+                
+        if file_path:
             self.output_file = file_path
-            self.output_label.setText(os.path.basename(file_path))
+            self.output_label.setText(os.path.basename(file_path) or file_path)
             self.check_enable_parse()
             
+    def clear_output(self):
+        # A file and a folder aren't interchangeable, so switching modes asks for the location again
+        self.output_file = None
+        self.output_label.setText('No output location selected')
+        self.check_enable_parse()
+        
     def check_enable_parse(self):
-        if self.input_file and self.output_file:
+        if self.input_files and self.output_file:
             self.parse_button.setEnabled(True)
         else:
             self.parse_button.setEnabled(False)
             
+    def per_file_outputs(self):
+        """Return an output workbook path in the output folder for each input file."""
+        outputs = []
+        for file_path in self.input_files:
+            stem = os.path.splitext(os.path.basename(file_path))[0]
+            output = os.path.join(self.output_file, stem + '.xlsx')
+            # Files from different folders may share a name
+            n = 2
+            while output in outputs:
+                output = os.path.join(self.output_file, f'{stem}_{n}.xlsx')
+                n += 1
+            outputs.append(output)
+        return outputs
+        
     def process_file(self):
-        if not self.input_file or not self.output_file:
+        if not self.input_files or not self.output_file:
             return
             
         # Disable buttons during processing
-        self.input_button.setEnabled(False)
-        self.output_button.setEnabled(False)
-        self.parse_button.setEnabled(False)
+        self.set_processing(True)
+        self.progress_bar.setValue(0)
         self.status_label.setText('Processing...')
-        
-        # Start processing in a separate thread
-        self.thread = ParserThread(self.input_file)
+        for row in range(self.file_table.rowCount()):
+            self.file_table.setItem(row, 1, QTableWidgetItem('Queued'))
+            self.file_table.setItem(row, 2, QTableWidgetItem(''))
+            
+        # Parse and save in a separate thread, which hands the files to a worker pool
+        if self.per_file_checkbox.isChecked():
+            self.thread = ParserThread(self.input_files, output_files=self.per_file_outputs())
+        else:
+            self.thread = ParserThread(self.input_files, output_file=self.output_file)
         self.thread.progress_signal.connect(self.update_progress)
-        self.thread.finished_signal.connect(self.save_results)
+        self.thread.status_signal.connect(self.status_label.setText)
+        self.thread.file_status_signal.connect(self.update_file_status)
+        self.thread.file_count_signal.connect(self.update_file_count)
+        self.thread.finished_signal.connect(self.show_success)
+        self.thread.cancelled_signal.connect(self.show_cancelled)
         self.thread.error_signal.connect(self.show_error)
         self.thread.start()
         
+    def set_processing(self, processing):
+        self.input_button.setEnabled(not processing)
+        self.folder_button.setEnabled(not processing)
+        self.output_button.setEnabled(not processing)
+        self.per_file_checkbox.setEnabled(not processing)
+        self.parse_button.setEnabled(not processing)
+        self.cancel_button.setEnabled(processing)
+        
+    def cancel_processing(self):
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText('Cancelling...')
+        self.thread.requestInterruption()
+        
     def update_progress(self, value):
         self.progress_bar.setValue(value)
         
-    def save_results(self, results):
-        try:
-            # Create dataframe and save to Excel
-            df = pd.DataFrame(results)
-            df.to_excel(self.output_file, index=False)
-            
-            # Show success message
-            QMessageBox.information(self, 'Success', 
-                                   f'Successfully processed {len(results)} specimens.\n'
-                                   f'Results saved to {self.output_file}')
-            
-            self.status_label.setText('Completed Successfully')
-        except Exception as e:
-            self.show_error(str(e))
-        finally:
-            # Re-enable buttons
-            self.input_button.setEnabled(True)
-            self.output_button.setEnabled(True)
-            self.parse_button.setEnabled(True)
-            
+    def update_file_status(self, row, status):
+        self.file_table.setItem(row, 1, QTableWidgetItem(status))
+        
+    def update_file_count(self, row, count):
+        self.file_table.setItem(row, 2, QTableWidgetItem(str(count)))
+        
+    def show_success(self, count, failed):
+        self.set_processing(False)
+        self.status_label.setText('Completed Successfully' if not failed else f'Completed, {failed} files failed')
+        
+        # Show success message
+        files = len(self.input_files)
+        QMessageBox.information(self, 'Success',
+                               f'Successfully processed {count} specimens from {files - failed} of {files} files.\n'
+                               f'Results saved to {self.output_file}')
+                               
+    def show_cancelled(self):
+        self.set_processing(False)
+        self.progress_bar.setValue(0)
+        self.status_label.setText('Cancelled')
+        
     def show_error(self, error_message):
-        QMessageBox.critical(self, 'Error', f'An error occurred:\n{error_message}')
+        # Re-enable buttons
+        self.set_processing(False)
         self.status_label.setText('Error')
+        QMessageBox.critical(self, 'Error', f'An error occurred:\n{error_message}')
         
-        # Re-enable buttons
-        self.input_button.setEnabled(True)
-        self.output_button.setEnabled(True)
-        self.parse_button.setEnabled(True)
+    def closeEvent(self, event):
+        # Stop a running pipeline before the window goes away
+        thread = getattr(self, 'thread', None)
+        if thread is not None and thread.isRunning():
+            thread.requestInterruption()
+            thread.wait()
+        event.accept()
 
 if __name__ == '__main__':
+    # Worker processes of a frozen app must not start another window
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = LabResultsApp()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if '--startup-check' in sys.argv:
+        # Quit as soon as the window is up; bench_startup.py times launches this way
+        QTimer.singleShot(0, app.quit)
+    sys.exit(app.exec_())
@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from parse_profile import peak_rss_mb
+
+PANEL_TESTS = [
+    "Adenovirus",
+    "Coronavirus HKU1",
+    "Coronavirus NL63",
+    "Coronavirus 229E",
+    "Coronavirus OC43",
+    "Human Metapneumovirus",
+    "Human Rhinovirus/Enterovirus",
+    "Influenza A",
+    "Influenza A/H1",
+    "Influenza A/H3",
+    "Influenza A/H1-2009",
+    "Influenza B",
+    "Parainfluenza Virus 1",
+    "Parainfluenza Virus 2",
+    "Parainfluenza Virus 3",
+    "Parainfluenza Virus 4",
+    "RSV",
+    "Bordetella pertussis",
+    "Chlamydophila pneumoniae",
+    "Mycoplasma pneumoniae",
+]
+
+RULE = "=" * 80
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+ENTRY_POINTS = ['stream', 'mmap', 'parallel', 'tkinter']
+EXPORT_FORMATS = ['csv', 'xlsx', 'parquet']
+
+
+def specimen_report(sample_id, run_date, age_sex, comp, detected, marker):
+    """Return the text of one report in the layout of sample_lab_report.txt."""
+    interp = "; ".join(test.upper() for test in detected) + " DETECTED" if detected else "NO PATHOGEN DETECTED"
+    lines = [
+        RULE,
+        "                    BIOFIRE RESPIRATORY PANEL REPORT",
+        RULE,
+        "",
+        f"RUN DATE: {run_date}                    LAB ID: BF-{sample_id}",
+        "LOCATION: Main Laboratory             OPERATOR: Lab Tech 01",
+        "",
+        RULE,
+        "PATIENT INFORMATION",
+        RULE,
+        "",
+        f"{marker} {sample_id}",
+        f"AGE/SEX: {age_sex}",
+        "PATIENT NAME: Sample, Patient",
+        "",
+        f"COMP: {comp}",
+        "",
+        RULE,
+        "TEST RESULTS",
+        RULE,
+        "",
+        "Respiratory PCR Panel Interp        Final",
+        f"                                   {interp}",
+        "",
+        "---Test Details---",
+        "",
+    ]
+    for test in PANEL_TESTS:
+        lines.append(f"{test:<35}Final")
+        lines.append("                                   " + ("Detected" if test in detected else "Not Detected"))
+        lines.append("")
+    lines += [RULE, f"END OF REPORT FOR SPECIMEN {sample_id}", RULE, "", ""]
+    return "\n".join(lines)
+
+
+def generate_report(path, specimens, detection_rate=0.3, duplicate_rate=0.02, specimen_variant_rate=0.1, seed=0):
+    """Write a synthetic BioFire report with the given number of specimen sections.
+
+    detection_rate is the share of specimens with a detected pathogen,
+    duplicate_rate the share that reuse an earlier specimen ID, and
+    specimen_variant_rate the share written with "Specimen:" instead of
+    "SPEC #:".
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for i in range(specimens):
+            if i and rng.random() < duplicate_rate:
+                sample_id = f"S{rng.randrange(i):08d}"
+            else:
+                sample_id = f"S{i:08d}"
+            day = 1 + i % 28
+            detected = []
+            if rng.random() < detection_rate:
+                detected = rng.sample(PANEL_TESTS, 1 if rng.random() < 0.9 else 2)
+            marker = "Specimen:" if rng.random() < specimen_variant_rate else "SPEC #:"
+            file.write(specimen_report(
+                sample_id,
+                f"01/{day:02d}/25",
+                f"{rng.randint(0, 99)}/{rng.choice('MF')}",
+                f"01/{day:02d}/25-{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}",
+                detected,
+                marker,
+            ))
+
+
+def run_entry_point(entry_point, path, workers):
+    """Parse path with one entry point; returns (specimens, seconds, peak RSS in MB)."""
+    started = time.perf_counter()
+    if entry_point == 'tkinter':
+        from lab_report_extractor import extract_lab_data
+        specimens = len(extract_lab_data(path))
+    else:
+        from lab_parser import parse_specimens
+        if entry_point == 'parallel':
+            specimens = len(parse_specimens(path, workers=workers))
+        else:
+            specimens = len(parse_specimens(path, backend=entry_point))
+    return specimens, time.perf_counter() - started, peak_rss_mb()
+
+
+def run_export(format, path, output_dir):
+    """Parse path and time exporting the rows; returns (rows, export seconds, peak RSS in MB)."""
+    from lab_export import export_results
+    from lab_parser import iter_results, parse_specimens
+
+    specimens_data = parse_specimens(path)
+    started = time.perf_counter()
+    rows = export_results(iter_results(specimens_data), os.path.join(output_dir, f"bench.{format}"), format)
+    return rows, time.perf_counter() - started, peak_rss_mb()
+
+
+def measure(function, *args):
+    """Run function in a fresh process, so peak RSS covers only that run."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(function, *args).result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the lab report parser on synthetic reports.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="specimens per report (default: %(default)s)")
+    parser.add_argument('--entry-points', nargs='+', choices=ENTRY_POINTS, default=ENTRY_POINTS)
+    parser.add_argument('--exports', nargs='*', choices=EXPORT_FORMATS, default=EXPORT_FORMATS)
+    parser.add_argument('--detection-rate', type=float, default=0.3)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--specimen-variant-rate', type=float, default=0.1, help="share of \"Specimen:\" markers")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="workers for the parallel entry point")
+    parser.add_argument('--workdir', help="where generated reports are kept and reused (default: a temporary directory)")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='lab_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+
+    print(f"{'specimens':>10} {'step':<14} {'seconds':>9} {'specimens/s':>12} {'peak MB':>9}")
+    for size in args.sizes:
+        path = os.path.join(workdir, f"report_{size}_{args.detection_rate}_{args.duplicate_rate}_{args.specimen_variant_rate}.txt")
+        if not os.path.exists(path):
+            generate_report(path, size, args.detection_rate, args.duplicate_rate, args.specimen_variant_rate)
+
+        steps = [(entry_point, run_entry_point, (entry_point, path, args.workers)) for entry_point in args.entry_points]
+        steps += [(f"export-{format}", run_export, (format, path, workdir)) for format in args.exports]
+        for name, function, function_args in steps:
+            try:
+                count, seconds, peak = measure(function, *function_args)
+            except ImportError as e:
+                print(f"{size:>10} {name:<14} skipped: {e}")
+                continue
+            rate = size / seconds if seconds else float('inf')
+            print(f"{size:>10} {name:<14} {seconds:>9.3f} {rate:>12.0f} {peak:>9.1f}")
+            results.append({
+                'specimens': size,
+                'bytes': os.path.getsize(path),
+                'step': name,
+                'records': count,
+                'seconds': round(seconds, 4),
+                'specimens_per_second': round(rate),
+                'peak_rss_mb': round(peak, 1),
+            })
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
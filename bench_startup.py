@@ -0,0 +1,80 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that dominate startup when they are imported eagerly
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'pyarrow', 'PyQt5', 'tkinter']
+# Toolkits the command line tool must never import
+GUI_MODULES = {'PyQt5', 'tkinter'}
+
+# Each entry point is launched the way a user would, and exits as soon as it is ready
+ENTRY_POINTS = {
+    'cli': [os.path.join(ROOT, 'parse_lab_results.py'), '--help'],
+    'tkinter': ['-c', 'import lab_report_extractor'],
+    'pyqt': [os.path.join(ROOT, 'LabParserApp', 'lab_results_app.py'), '--startup-check'],
+}
+
+
+def launch_seconds(command, env):
+    started = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def imported_heavy_modules(args, env):
+    """Return the HEAVY_MODULES a Python entry point imports at startup."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:'):
+            module = line.rsplit('|', 1)[-1].strip()
+            imported.add(module.split('.')[0])
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time how long each entry point takes to start.")
+    parser.add_argument('--entry-points', nargs='+', choices=sorted(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument('--bundle', help="also time this PyInstaller build of the PyQt app")
+    parser.add_argument('--repeat', type=int, default=5, help="launches per entry point (default: %(default)s)")
+    parser.add_argument('--budget', type=float, default=1.0, help="seconds allowed for a launch (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # Let the PyQt app start without a display
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+
+    launches = [(name, [sys.executable] + ENTRY_POINTS[name], ENTRY_POINTS[name]) for name in args.entry_points]
+    if args.bundle:
+        launches.append(('bundle', [args.bundle, '--startup-check'], None))
+
+    failed = False
+    print(f"{'entry point':<12} {'median s':>9} {'min s':>7}  heavy imports")
+    for name, command, python_args in launches:
+        try:
+            times = [launch_seconds(command, env) for _ in range(args.repeat)]
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"{name:<12} skipped: {e}")
+            continue
+
+        heavy = imported_heavy_modules(python_args, env) if python_args else []
+        median = statistics.median(times)
+        notes = ', '.join(heavy) or '-'
+        if median > args.budget:
+            failed = True
+            notes += f"  (over the {args.budget}s budget)"
+        if name == 'cli' and GUI_MODULES.intersection(heavy):
+            failed = True
+            notes += "  (imports a GUI toolkit)"
+        print(f"{name:<12} {median:>9.3f} {min(times):>7.3f}  {notes}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from lab_export import RESULT_COLUMNS, output_format
+from lab_parser import TEST_NAMES
+
+# Columns identifying each specimen, ahead of one boolean column per target
+ID_COLUMNS = RESULT_COLUMNS[:4]
+
+
+def detection_matrix(specimens_data, targets=None):
+    """Return a DataFrame with one row per specimen and one boolean column per panel target.
+
+    The matrix is filled straight from each record's test codes, without
+    building or parsing Result strings. targets fixes the target columns and
+    their order (targets never detected get an all-False column); by default
+    every target detected in specimens_data is included, in first-seen order.
+    """
+    records = list(specimens_data.values())
+    lengths = np.fromiter((len(record.tests) for record in records), dtype=np.intp, count=len(records))
+    codes = np.fromiter(chain.from_iterable(record.tests for record in records), dtype=np.intp, count=int(lengths.sum()))
+
+    # Set every (specimen, test code) pair in one vectorized assignment
+    detected = np.zeros((len(records), len(TEST_NAMES.names)), dtype=bool)
+    detected[np.repeat(np.arange(len(records)), lengths), codes] = True
+
+    seen = np.unique(codes)
+    matrix = pd.DataFrame(detected[:, seen], columns=[TEST_NAMES.names[code] for code in seen])
+    if targets is not None:
+        matrix = matrix.reindex(columns=list(targets), fill_value=False)
+
+    ids = pd.DataFrame({
+        "Date": [record.run_date for record in records],
+        "Sample ID #": list(specimens_data),
+        "Age": [record.age_sex for record in records],
+        "COMP DATE-Time": [record.comp_date_time for record in records],
+    }, columns=ID_COLUMNS)
+    return pd.concat([ids, matrix], axis=1)
+
+
+def target_columns(matrix):
+    """Return the target columns of a detection matrix."""
+    return [column for column in matrix.columns if column not in ID_COLUMNS]
+
+
+def counts_by_run_date(matrix):
+    """Return detections per run date and target, with the number of specimens run that day."""
+    grouped = matrix.groupby("Date", sort=False)
+    counts = grouped[target_columns(matrix)].sum()
+    counts.insert(0, "Specimens", grouped.size())
+    return counts
+
+
+def positivity_by_run_date(matrix):
+    """Return the share of specimens positive for each target, per run date."""
+    return matrix.groupby("Date", sort=False)[target_columns(matrix)].mean()
+
+
+def pathogen_counts(matrix):
+    """Return the number of specimens positive for each target, most frequent first."""
+    return matrix[target_columns(matrix)].sum().sort_values(ascending=False, kind='stable')
+
+
+def export_matrix(matrix, path, format=None):
+    """Write a detection matrix to path in any of the lab_export output formats."""
+    format = output_format(path, format)
+    if format == 'csv':
+        matrix.to_csv(path, index=False)
+    elif format == 'xlsx':
+        matrix.to_excel(path, index=False)
+    elif format == 'parquet':
+        matrix.to_parquet(path, index=False)
+    else:
+        matrix.to_feather(path)
@@ -0,0 +1,144 @@
+import csv
+import os
+from functools import partial
+
+# Output columns, in order
+RESULT_COLUMNS = ["Date", "Sample ID #", "Age", "COMP DATE-Time", "Result"]
+
+# Rows buffered per Arrow record batch
+ARROW_BATCH_SIZE = 65536
+# Rows written between calls to an export progress callback
+EXPORT_PROGRESS_ROWS = 1000
+
+
+class CsvWriter:
+    """Stream result rows to a CSV file."""
+
+    def __init__(self, path, columns=RESULT_COLUMNS, append=False):
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction='ignore')
+        if new_file:
+            self.writer.writeheader()
+
+    def write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWriter:
+    """Stream result rows to an Excel workbook using openpyxl's constant-memory write-only mode."""
+
+    def __init__(self, path, columns=RESULT_COLUMNS):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font
+
+        self.path = path
+        self.columns = columns
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('Sheet1')
+
+        # Bold, centred header, as pandas' to_excel wrote it
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(self.sheet, value=column)
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center')
+            header.append(cell)
+        self.sheet.append(header)
+
+    def write_row(self, row):
+        self.sheet.append([row.get(column) for column in self.columns])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class ArrowWriter:
+    """Stream result rows to a Parquet or Arrow IPC file in record batches."""
+
+    def __init__(self, path, columns=RESULT_COLUMNS, format='parquet'):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(column, pa.string()) for column in columns])
+        self.batch = {column: [] for column in columns}
+        self.pending = 0
+        if format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write_row(self, row):
+        for column in self.columns:
+            self.batch[column].append(row.get(column))
+        self.pending += 1
+        if self.pending >= ARROW_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.writer.write_table(self.pa.Table.from_pydict(self.batch, schema=self.schema))
+            self.batch = {column: [] for column in self.columns}
+            self.pending = 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+# Writer per output format; formats are picked from the file extension unless given
+WRITERS = {
+    'csv': CsvWriter,
+    'xlsx': XlsxWriter,
+    'parquet': partial(ArrowWriter, format='parquet'),
+    'arrow': partial(ArrowWriter, format='arrow'),
+}
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.xlsx': 'xlsx',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+def output_format(path, format=None):
+    """Return the writer format for path: format if given, else from the extension (xlsx by default)."""
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'xlsx')
+    if format not in WRITERS:
+        raise ValueError(f"Unknown output format {format!r}; expected one of {', '.join(WRITERS)}")
+    return format
+
+
+def open_writer(path, format=None, columns=RESULT_COLUMNS):
+    """Open a row writer for path."""
+    return WRITERS[output_format(path, format)](path, columns=columns)
+
+
+def export_results(rows, path, format=None, columns=RESULT_COLUMNS, progress=None):
+    """Write result rows to path as they are produced, without building a DataFrame.
+
+    If given, progress(count) is called every EXPORT_PROGRESS_ROWS rows and
+    once at the end; an exception it raises stops the export. Returns the
+    number of rows written.
+    """
+    writer = open_writer(path, format, columns)
+    count = 0
+    try:
+        for row in rows:
+            writer.write_row(row)
+            count += 1
+            if progress and count % EXPORT_PROGRESS_ROWS == 0:
+                progress(count)
+        if progress:
+            progress(count)
+    finally:
+        writer.close()
+    return count
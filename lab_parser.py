@@ -0,0 +1,861 @@
+import codecs
+import io
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import accumulate, groupby
+
+from report_grammar import DEFAULT_GRAMMAR
+
+# Bump whenever a change alters the parsed output, so cached results are discarded
+PARSER_VERSION = 2
+
+# Bytes for which bytes and str regexes disagree (\s, strip(), universal newlines, char offsets);
+# files containing any of them are parsed through the text path instead
+NON_ASCII_TEXT_PATTERN = re.compile(rb'[\r\x1c-\x1f\x80-\xff]')
+
+# Characters read per step by the streaming parser
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Parallel mode: below this many bytes per chunk a process pool costs more than it saves
+PARALLEL_MIN_CHUNK_SIZE = 4 << 20
+# Chunks handed out per worker, so uneven chunks still balance across the pool
+PARALLEL_CHUNKS_PER_WORKER = 4
+SPLIT_SEARCH_WINDOW = 1 << 20
+
+# Compressed inputs are decompressed as they are read, by the module named for their extension
+COMPRESSED_EXTENSIONS = {'.gz': 'gzip', '.xz': 'lzma', '.bz2': 'bz2'}
+# Compressed formats whose uncompressed size can't be read reliably without decompressing the whole file
+# (the gzip trailer only holds it modulo 4 GiB, and only for the last member of a concatenated file)
+UNSIZED_EXTENSIONS = ('.gz', '.xz', '.bz2')
+# Separates a zip archive from one of its member reports in an input path, e.g. "january.zip::0115.txt"
+ZIP_MEMBER_SEPARATOR = '::'
+# Zip archives held open by shared_zip, by path; reading an archive's central directory costs time in its
+# number of members, so members are opened from these rather than by opening the archive once per member
+SHARED_ZIPS = {}
+
+# Minimum seconds between progress reports let through by throttle_progress
+PROGRESS_INTERVAL = 0.1
+
+
+class HeaderCursor:
+    """Carry a header field (e.g. RUN DATE, AGE/SEX) forward as specimens are scanned in order.
+
+    Each cursor looks for its own markers with str.find, so new text is
+    searched once per header marker rather than in a single pass. A combined
+    regex over every header marker was measured at about four times slower
+    than the separate finds for the two BioFire header markers.
+    """
+
+    def __init__(self, pattern, markers, lookbehind):
+        self.pattern = pattern
+        self.markers = markers
+        self.lookbehind = lookbehind
+        self.positions = []
+        self.index = 0
+
+    def scan(self, buffer, offset, old_end):
+        """Record markers in text appended to buffer after absolute position old_end."""
+        found = []
+        for marker in self.markers:
+            # Back up far enough to catch a marker split across the previous piece
+            pos = max(offset, old_end - len(marker) + 1) - offset
+            while True:
+                pos = buffer.find(marker, pos)
+                if pos == -1:
+                    break
+                found.append(offset + pos)
+                pos += len(marker)
+        if len(self.markers) > 1:
+            found.sort()
+        self.positions.extend(found)
+
+    def value_before(self, buffer, offset, start_pos):
+        """Return the first header value in the lookbehind window before start_pos, or None."""
+        window_start = max(0, start_pos - self.lookbehind)
+        positions = self.positions
+
+        # Specimens arrive in file order, so markers left behind never need to be revisited
+        while self.index < len(positions) and positions[self.index] < window_start:
+            self.index += 1
+        if self.index > 1024:
+            del positions[:self.index]
+            self.index = 0
+
+        i = self.index
+        while i < len(positions) and positions[i] < start_pos:
+            # endpos keeps the value clipped to the window, as searching the slice did
+            match = self.pattern.match(buffer, positions[i] - offset, start_pos - offset)
+            if match:
+                return match.group(1)
+            i += 1
+        return None
+
+
+def as_text(value):
+    """Decode a field captured from a bytes scan; str values are returned unchanged."""
+    if isinstance(value, str):
+        return value
+    return value.decode('utf-8', errors='replace')
+
+
+class SectionScanner:
+    """Split report text into specimen sections as it is fed in, piece by piece.
+
+    A record is produced as soon as the next specimen marker closes its
+    section, and only the text still needed (the open section and its header
+    lookbehind) is kept, so memory stays bounded however large the input is.
+    Fields that are not found are reported as "Unknown".
+
+    Markers and fields come from a ReportGrammar (see report_grammar), the
+    BioFire layout by default. With binary=True the scanner works on bytes
+    (or a memory map) and only the captured fields are decoded. With a
+    StageTimings (see parse_profile), time spent searching for boundaries,
+    looking up header fields and scanning sections is recorded in it.
+    """
+
+    def __init__(self, binary=False, start=0, timings=None, grammar=DEFAULT_GRAMMAR):
+        self.grammar = grammar
+        self.patterns = grammar.patterns(binary)
+        self.buffer = b'' if binary else ''
+        self.offset = 0        # absolute position of buffer[0]
+        self.text_end = 0      # absolute end of the last non-whitespace text seen
+        self.search_pos = start  # where to resume looking for the next specimen marker
+        self.boundary_pos = 0  # where to resume looking for the end of the open section
+        self.pending = None    # (sample_id, start) of the section still open
+        self.headers = [
+            (field, HeaderCursor(pattern, markers, grammar.lookbehind))
+            for field, pattern, markers in self.patterns.headers
+        ]
+        self.timings = timings
+
+    def feed(self, text):
+        """Add text and yield records for every section it closes."""
+        old_end = self.offset + len(self.buffer)
+        self.buffer += text
+        stripped = text.rstrip()
+        if stripped:
+            self.text_end = old_end + len(stripped)
+        for _, cursor in self.headers:
+            cursor.scan(self.buffer, self.offset, old_end)
+
+        yield from self._drain(final=False)
+
+        # Drop text no later section can reach; done once per piece to keep trimming linear
+        keep_from = self.search_pos if self.pending is None else self.pending[1]
+        keep_from = max(self.offset, keep_from - self.grammar.lookbehind)
+        if keep_from > self.offset:
+            self.buffer = self.buffer[keep_from - self.offset:]
+            self.offset = keep_from
+
+    def close(self):
+        """Yield the records left once the end of the input has been reached."""
+        yield from self._drain(final=True)
+        self.buffer = self.buffer[:0]
+
+    def scan(self, content, start=0):
+        """Yield the records of a complete document, scanning it in place without copying."""
+        self.buffer = content
+        self.search_pos = start
+        for _, cursor in self.headers:
+            cursor.scan(content, 0, 0)
+        yield from self.close()
+
+    def _drain(self, final):
+        buffer, offset, timings = self.buffer, self.offset, self.timings
+        while True:
+            if timings is not None:
+                started = time.perf_counter()
+            if self.pending is None:
+                match = self.patterns.specimen.search(buffer, self.search_pos - offset)
+                # A match touching the end of the text may still grow its specimen ID
+                if match is None or (match.end() == len(buffer) and not final):
+                    if match is None:
+                        self.search_pos = max(self.search_pos, self.text_end - self.grammar.max_marker_length)
+                    if timings is not None:
+                        timings.add('boundary search', time.perf_counter() - started)
+                    return
+                self.pending = (as_text(match.group(1)), offset + match.start())
+                self.search_pos = offset + match.end()
+                self.boundary_pos = offset + match.start() + 1
+
+            # The section runs from this match to the next specimen marker (or end of file)
+            sample_id, start_pos = self.pending
+            boundary = self.patterns.boundary.search(buffer, self.boundary_pos - offset)
+            if boundary is not None:
+                section_end = offset + boundary.start()
+            elif final:
+                section_end = offset + len(buffer)
+            else:
+                self.boundary_pos = max(self.boundary_pos, self.text_end - self.grammar.max_marker_length)
+                if timings is not None:
+                    timings.add('boundary search', time.perf_counter() - started)
+                return
+
+            if timings is not None:
+                timings.add('boundary search', time.perf_counter() - started)
+            self.pending = None
+            yield self._record(sample_id, start_pos, section_end)
+
+    def _record(self, sample_id, start_pos, section_end):
+        buffer, offset, patterns, timings = self.buffer, self.offset, self.patterns, self.timings
+        start, end = start_pos - offset, section_end - offset
+        if timings is not None:
+            started = time.perf_counter()
+
+        # Prefer the header just before the specimen, falling back to the section itself
+        fields = {}
+        for field, cursor in self.headers:
+            value = cursor.value_before(buffer, offset, start_pos)
+            if value is not None:
+                fields[field] = value
+
+        if timings is not None:
+            headers_done = time.perf_counter()
+            timings.add('header lookup', headers_done - started)
+
+        # One pass over the section finds the first value of every field and every test line
+        section_groups = patterns.section_groups
+        detected, not_detected = patterns.detected, patterns.not_detected
+        detected_tests = []
+        next_test = start
+        for match in patterns.section.finditer(buffer, start, end):
+            group = match.lastindex
+            field = section_groups[group]
+            if field is not None:
+                if field not in fields:
+                    fields[field] = match.group(group)
+                continue
+
+            # Only the first status marker on a line counts, and the result line may be a test line itself
+            status_pos = match.start()
+            if status_pos < next_test:
+                continue
+            next_test = match.start(group)
+            result_line = match.group(group)
+            if detected in result_line and not_detected not in result_line:
+                line_start = buffer.rfind(patterns.newline, start, status_pos) + 1 or start
+                line = buffer[line_start:next_test - 1].strip()
+                if not line.startswith(patterns.skip_prefix):
+                    detected_tests.append(as_text(line.split(patterns.status)[0].strip()))
+
+        if timings is not None:
+            timings.add('section scan', time.perf_counter() - headers_done)
+
+        return {
+            'sample_id': sample_id,
+            'run_date': as_text(fields.get('run_date', "Unknown")),
+            'age_sex': as_text(fields.get('age_sex', "Unknown")),
+            'comp_date_time': as_text(fields.get('comp_date_time', "Unknown")),
+            'detected_tests': detected_tests,
+            'offset': start_pos,
+        }
+
+
+def iter_specimen_sections(content, start=0, timings=None, grammar=DEFAULT_GRAMMAR):
+    """Yield one record per specimen marker in content (str, bytes or mmap), in file order.
+
+    Specimen markers before start are not reported, but the text before it is
+    still used as header lookbehind.
+    """
+    scanner = SectionScanner(binary=not isinstance(content, str), timings=timings, grammar=grammar)
+    yield from scanner.scan(content, start)
+
+
+def split_zip_member(file_path):
+    """Split "archive.zip::member" into (archive, member); other paths give (file_path, None)."""
+    archive, separator, member = file_path.partition(ZIP_MEMBER_SEPARATOR)
+    if separator and archive.lower().endswith('.zip'):
+        return archive, member
+    return file_path, None
+
+
+def is_zip_archive(file_path):
+    return file_path.lower().endswith('.zip')
+
+
+def is_plain_report(file_path):
+    """Check that file_path is an uncompressed file, which can be split, mapped and followed."""
+    return (not is_zip_archive(file_path) and split_zip_member(file_path)[1] is None
+            and os.path.splitext(file_path)[1].lower() not in COMPRESSED_EXTENSIONS)
+
+
+@contextmanager
+def shared_zip(archive):
+    """Open a zip archive once for the body of a with statement, and yield its ZipFile.
+
+    Meanwhile its members are opened and sized from this ZipFile instead of
+    reopening the archive for each of them. Nested uses share one ZipFile.
+    """
+    if archive in SHARED_ZIPS:
+        yield SHARED_ZIPS[archive]
+        return
+    import zipfile
+
+    with zipfile.ZipFile(archive) as zip_file:
+        SHARED_ZIPS[archive] = zip_file
+        try:
+            yield zip_file
+        finally:
+            del SHARED_ZIPS[archive]
+
+
+def zip_reports(zip_file):
+    """Return the ZipInfo of each .txt report in an open zip archive, in archive order."""
+    return [
+        info for info in zip_file.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.txt') and not info.filename.startswith('__MACOSX/')
+    ]
+
+
+def zip_members(archive):
+    """Return the paths of the .txt reports in a zip archive, in archive order."""
+    with shared_zip(archive) as zip_file:
+        return [archive + ZIP_MEMBER_SEPARATOR + info.filename for info in zip_reports(zip_file)]
+
+
+def report_stat(file_path):
+    """os.stat() of the file holding a report (the archive, for a zip member)."""
+    return os.stat(split_zip_member(file_path)[0])
+
+
+def report_size(file_path):
+    """Return the uncompressed size of a zip archive or member, else the report's size on disk."""
+    archive, member = split_zip_member(file_path)
+    if member is not None or is_zip_archive(file_path):
+        with shared_zip(archive) as zip_file:
+            if member is not None:
+                return zip_file.getinfo(member).file_size
+            return sum(info.file_size for info in zip_reports(zip_file))
+
+    return os.path.getsize(file_path)
+
+
+def report_sizes(paths):
+    """Return {path: report_size(path)}, opening each zip archive once for all of its members.
+
+    Paths whose size can't be read are left out.
+    """
+    sizes = {}
+    for archive, group in groupby(paths, key=zip_archive_of):
+        group = list(group)
+        try:
+            with shared_zip(archive) if archive else nullcontext():
+                for path in group:
+                    try:
+                        sizes[path] = report_size(path)
+                    except (OSError, KeyError):
+                        pass
+        except Exception:
+            # An unreadable archive; its members fail when they are parsed
+            pass
+    return sizes
+
+
+def zip_archive_of(file_path):
+    """Return the archive of a zip member path, or None for any other path."""
+    archive, member = split_zip_member(file_path)
+    return archive if member is not None else None
+
+
+def open_report_binary(file_path):
+    """Open a report for reading bytes, decompressing .gz, .xz and .bz2 files and zip members as they are read."""
+    archive, member = split_zip_member(file_path)
+    if member is not None:
+        # The member keeps the archive's file open until it is closed itself
+        with shared_zip(archive) as zip_file:
+            return zip_file.open(member)
+
+    module = COMPRESSED_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+    if module is not None:
+        return __import__(module).open(file_path, 'rb')
+    return open(file_path, 'rb')
+
+
+def open_report(file_path):
+    """Open a report as text, decoded the same way whether or not it is compressed."""
+    if is_plain_report(file_path):
+        return open(file_path, 'r', encoding='utf-8', errors='replace')
+    return io.TextIOWrapper(open_report_binary(file_path), encoding='utf-8', errors='replace')
+
+
+def iter_decoded(file, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield bytes [start, end) of a binary file as text, decoded as iter_lab_records' open() would."""
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+    file.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        raw = file.read(min(chunk_size, remaining))
+        if not raw:
+            break
+        remaining -= len(raw)
+        yield decoder.decode(raw, final=remaining <= 0)
+
+
+def iter_lab_records(file_path, chunk_size=STREAM_CHUNK_SIZE, timings=None, grammar=DEFAULT_GRAMMAR):
+    """Stream one record per specimen section of the file, reading it chunk by chunk.
+
+    Compressed files are decompressed as they are read. A zip archive yields
+    the records of each member report in turn, with offsets counted across
+    members. Duplicate specimen IDs are not merged here; see merge_specimen.
+    """
+    if is_zip_archive(file_path):
+        base = 0
+        with shared_zip(file_path) as zip_file:
+            for info in zip_reports(zip_file):
+                member = file_path + ZIP_MEMBER_SEPARATOR + info.filename
+                for record in iter_lab_records(member, chunk_size, timings, grammar):
+                    record['offset'] += base
+                    yield record
+                base += info.file_size
+        return
+
+    scanner = SectionScanner(timings=timings, grammar=grammar)
+    with open_report(file_path) as file:
+        while True:
+            if timings is not None:
+                started = time.perf_counter()
+            chunk = file.read(chunk_size)
+            if timings is not None:
+                timings.add('read and decode', time.perf_counter() - started)
+            if not chunk:
+                break
+            yield from scanner.feed(chunk)
+    yield from scanner.close()
+
+
+def iter_lab_records_mmap(file_path, timings=None, grammar=DEFAULT_GRAMMAR):
+    """Yield the same records as iter_lab_records by scanning a memory map of the file as bytes.
+
+    The file is never decoded as a whole; only captured fields are. Files that
+    are not plain ASCII text (including CRLF files, since universal newlines
+    would move offsets), and compressed files, which cannot be mapped, are
+    handed to iter_lab_records so the output stays identical; finding out
+    takes a scan of the whole map first. It is neither faster nor smaller
+    than iter_lab_records, whose memory is already bounded by its chunk size:
+    the mapped pages count towards the process's memory, and the bytes scan
+    is slower. It is kept as an alternative for benchmarking.
+    """
+    if not is_plain_report(file_path):
+        yield from iter_lab_records(file_path, timings=timings, grammar=grammar)
+        return
+
+    with open(file_path, 'rb') as file:
+        try:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped and contain no specimens
+            return
+        try:
+            if NON_ASCII_TEXT_PATTERN.search(mapping) is None:
+                yield from iter_specimen_sections(mapping, timings=timings, grammar=grammar)
+                return
+        finally:
+            mapping.close()
+
+    yield from iter_lab_records(file_path, timings=timings, grammar=grammar)
+
+
+# Record sources selectable through parse_lab_results(backend=...); 'stream' is both the fastest and the
+# smallest, and 'mmap' is kept for benchmarking against it
+BACKENDS = {
+    'stream': iter_lab_records,
+    'mmap': iter_lab_records_mmap,
+}
+
+
+class NameTable:
+    """Intern table giving each distinct name a small integer code, in first-seen order."""
+
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def encode(self, names):
+        """Return the codes of names as a tuple (the shared empty tuple when there are none)."""
+        return tuple(self.code(name) for name in names)
+
+    def decode(self, codes):
+        return [self.names[code] for code in codes]
+
+
+# Detected test names seen by this process; codes are only meaningful within it
+TEST_NAMES = NameTable()
+
+
+class SpecimenRecord:
+    """Merged data for one specimen, kept small since there may be millions of them.
+
+    Run dates and ages repeat across specimens and are interned, and detected
+    tests are held as TEST_NAMES codes. Records are pickled (and cached) with
+    test names, so they can be passed between processes.
+    """
+
+    __slots__ = ('run_date', 'age_sex', 'comp_date_time', 'tests')
+
+    def __init__(self, run_date, age_sex, comp_date_time, detected_tests=()):
+        self.run_date = sys.intern(run_date)
+        self.age_sex = sys.intern(age_sex)
+        self.comp_date_time = comp_date_time
+        self.tests = TEST_NAMES.encode(detected_tests)
+
+    @classmethod
+    def from_section(cls, record):
+        """Build a record from a section record produced by SectionScanner."""
+        return cls(record['run_date'], record['age_sex'], record['comp_date_time'], record['detected_tests'])
+
+    @property
+    def detected_tests(self):
+        return TEST_NAMES.decode(self.tests)
+
+    def merge(self, other):
+        """Fold in a later record for the same specimen; the first non-Unknown value of each field wins."""
+        if self.run_date == "Unknown":
+            self.run_date = other.run_date
+        if self.age_sex == "Unknown":
+            self.age_sex = other.age_sex
+        if self.comp_date_time == "Unknown":
+            self.comp_date_time = other.comp_date_time
+        if other.tests:
+            self.tests += other.tests
+
+    def copy(self):
+        record = SpecimenRecord.__new__(SpecimenRecord)
+        record.run_date, record.age_sex, record.comp_date_time, record.tests = (
+            self.run_date, self.age_sex, self.comp_date_time, self.tests)
+        return record
+
+    def to_json(self):
+        return [self.run_date, self.age_sex, self.comp_date_time, self.detected_tests]
+
+    def __reduce__(self):
+        return SpecimenRecord, tuple(self.to_json())
+
+    def __eq__(self, other):
+        if not isinstance(other, SpecimenRecord):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return f"SpecimenRecord{tuple(self.to_json())!r}"
+
+
+def merge_specimen(specimens_data, record):
+    """Fold a section record into specimens_data; the first non-Unknown value of each field wins."""
+    data = specimens_data.get(record['sample_id'])
+    if data is None:
+        specimens_data[record['sample_id']] = SpecimenRecord.from_section(record)
+    else:
+        data.merge(SpecimenRecord.from_section(record))
+
+
+def merge_specimens(specimens_data, other):
+    """Fold another specimens_data mapping into specimens_data, keeping first-seen order."""
+    for sample_id, data in other.items():
+        existing = specimens_data.get(sample_id)
+        if existing is None:
+            specimens_data[sample_id] = data.copy()
+        else:
+            existing.merge(data)
+
+
+def specimens_to_json(specimens_data):
+    """Convert specimens_data to plain JSON-serialisable lists, with tests by name."""
+    return {sample_id: data.to_json() for sample_id, data in specimens_data.items()}
+
+
+def specimens_from_json(content):
+    """Rebuild specimens_data from the output of specimens_to_json."""
+    return {sample_id: SpecimenRecord(*fields) for sample_id, fields in content.items()}
+
+
+def specimen_result(sample_id, data):
+    """Build the output row for one specimen's SpecimenRecord."""
+    detected_tests = data.detected_tests
+    return {
+        "Date": data.run_date,
+        "Sample ID #": sample_id,
+        "Age": data.age_sex,
+        "COMP DATE-Time": data.comp_date_time,
+        "Result": "Not detected" if not detected_tests else "; ".join([f"{test}: Detected" for test in detected_tests])
+    }
+
+
+def iter_results(specimens_data):
+    """Yield the output rows for merged specimen data, one per specimen in first-seen order."""
+    for sample_id, data in specimens_data.items():
+        yield specimen_result(sample_id, data)
+
+
+def specimens_to_results(specimens_data):
+    """Convert merged specimen data to the list of output rows."""
+    return list(iter_results(specimens_data))
+
+
+def is_safe_split(file, position, grammar=DEFAULT_GRAMMAR):
+    """Check that a line-start specimen marker at position cannot be the ID of an earlier marker.
+
+    Anything ambiguous (non-ASCII or blank text before it) is treated as unsafe.
+    """
+    file.seek(max(0, position - 64))
+    before = file.read(min(position, 64)).rstrip(b' \t\n\r\x0b\x0c')
+    if not before:
+        return False
+    if before[-1] >= 0x80 or 0x1c <= before[-1] <= 0x1f:
+        return False
+    return not before.endswith(grammar.specimen_markers_bytes)
+
+
+def find_split_point(file, target, size, grammar=DEFAULT_GRAMMAR):
+    """Return the offset of the first safe specimen boundary at or after target, or None."""
+    pos = target
+    while pos < size:
+        # Start one byte early so the newline before a marker at target is included
+        window_start = max(0, pos - 1)
+        file.seek(window_start)
+        window = file.read(SPLIT_SEARCH_WINDOW + 64)
+        for match in grammar.split_candidate.finditer(window):
+            position = window_start + match.start() + 1
+            if position >= target and is_safe_split(file, position, grammar):
+                return position
+        pos = window_start + SPLIT_SEARCH_WINDOW
+    return None
+
+
+def find_last_split_point(file, start, size, grammar=DEFAULT_GRAMMAR):
+    """Return the offset of the last safe specimen boundary after start, or None."""
+    window_end = size
+    while window_end > start + 1:
+        window_start = max(start, window_end - SPLIT_SEARCH_WINDOW)
+        file.seek(window_start)
+        window = file.read(window_end - window_start)
+        for match in reversed(list(grammar.split_candidate.finditer(window))):
+            position = window_start + match.start() + 1
+            if position > start and is_safe_split(file, position, grammar):
+                return position
+        # Overlap the windows so a candidate cut at the edge is seen whole next time
+        window_end = window_start + 64
+        if window_start == start:
+            break
+    return None
+
+
+def split_offsets(file_path, chunks, grammar=DEFAULT_GRAMMAR):
+    """Split the file into at most chunks byte ranges that each start at a specimen marker.
+
+    Returns the sorted list of range edges, from 0 to the file size.
+    """
+    size = os.path.getsize(file_path)
+    offsets = [0]
+    with open(file_path, 'rb') as file:
+        for k in range(1, chunks):
+            target = max(size * k // chunks, offsets[-1] + 1)
+            split = find_split_point(file, target, size, grammar)
+            if split is None:
+                break
+            offsets.append(split)
+    offsets.append(size)
+    return offsets
+
+
+def iter_chunk_records(file_path, start, end, grammar=DEFAULT_GRAMMAR):
+    """Stream the section records for the specimens in bytes [start, end) of the file.
+
+    start must be 0 or a safe split point; the text before it is used only as
+    header context.
+    """
+    context_start = max(0, start - grammar.context_bytes)
+    with open(file_path, 'rb') as file:
+        context = ''.join(iter_decoded(file, context_start, start))
+        if context_start > 0:
+            context = context[-grammar.lookbehind:]
+
+        scanner = SectionScanner(start=len(context), grammar=grammar)
+        yield from scanner.feed(context)
+        for text in iter_decoded(file, start, end):
+            yield from scanner.feed(text)
+    yield from scanner.close()
+
+
+def parse_chunk(file_path, start, end, grammar=DEFAULT_GRAMMAR):
+    """Parse and merge the specimens in bytes [start, end) of the file."""
+    specimens_data = {}
+    for record in iter_chunk_records(file_path, start, end, grammar):
+        merge_specimen(specimens_data, record)
+    return specimens_data
+
+
+def parse_members(archive, members, grammar=DEFAULT_GRAMMAR):
+    """Parse and merge the specimens of some members of a zip archive in turn, opening it once."""
+    specimens_data = {}
+    with shared_zip(archive):
+        for member in members:
+            for record in iter_lab_records(archive + ZIP_MEMBER_SEPARATOR + member, grammar=grammar):
+                merge_specimen(specimens_data, record)
+    return specimens_data
+
+
+def parse_specimens_parallel(file_path, workers, progress=None, grammar=DEFAULT_GRAMMAR):
+    """Parse the file in chunks on a pool of worker processes and merge them in file order.
+
+    A zip archive is parsed in runs of whole members instead, each run by one worker.
+    """
+    if is_zip_archive(file_path):
+        with shared_zip(file_path) as zip_file:
+            infos = zip_reports(zip_file)
+        step = -(-len(infos) // (workers * PARALLEL_CHUNKS_PER_WORKER)) or 1
+        runs = [infos[i:i + step] for i in range(0, len(infos), step)]
+        calls = [(parse_members, (file_path, [info.filename for info in run], grammar)) for run in runs]
+        ends = list(accumulate(sum(info.file_size for info in run) for run in runs))
+    else:
+        size = os.path.getsize(file_path)
+        chunks = min(workers * PARALLEL_CHUNKS_PER_WORKER, size // PARALLEL_MIN_CHUNK_SIZE)
+        offsets = split_offsets(file_path, max(chunks, 1), grammar)
+        calls = [(parse_chunk, (file_path, start, end, grammar)) for start, end in zip(offsets, offsets[1:])]
+        ends = offsets[1:]
+
+    specimens_data = {}
+    if len(calls) <= 1:
+        # Too small (or no safe boundary, or a single member) to be worth a pool
+        for function, args in calls:
+            merge_specimens(specimens_data, function(*args))
+        return specimens_data
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, *args) for function, args in calls]
+        # Chunks are merged in file order, so first-seen order and "first non-Unknown wins" hold
+        for future, end in zip(futures, ends):
+            merge_specimens(specimens_data, future.result())
+            if progress:
+                progress(end, ends[-1])
+    return specimens_data
+
+
+def parse_specimens(file_path, progress=None, backend='stream', workers=1, cache=None, timings=None,
+                    grammar=DEFAULT_GRAMMAR):
+    """Parse the text file into merged specimen data, keyed by specimen ID in first-seen order.
+
+    backend selects how the file is read (see BACKENDS). With workers > 1 (or
+    None for one per CPU) large files are split at specimen boundaries and
+    parsed in a process pool; each worker reads only its own byte range, so
+    backend does not apply. Compressed files (.gz, .xz, .bz2) are
+    decompressed as they are read and cannot be split; zip archives are
+    parsed member by member, in parallel with workers > 1. If given,
+    progress is called as progress(position, total) as specimens are read,
+    where total is the (uncompressed) file size; for .gz, .xz and .bz2 files,
+    whose uncompressed size is not known up front, position is None until
+    completion, so the callback can still check for cancellation. With a
+    ParseCache, an unchanged file is not parsed again; give the cache a
+    version that includes grammar.fingerprint when parsing another layout.
+    With a StageTimings (see parse_profile), the time spent in each stage is
+    recorded in it; parallel runs are timed as a whole. grammar is the report
+    layout (see report_grammar), BioFire by default.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    total = report_size(file_path)
+    started = time.perf_counter()
+    specimens_data = cache.get(file_path) if cache else None
+    if timings is not None and cache:
+        timings.add('cache', time.perf_counter() - started)
+    if specimens_data is None:
+        if workers > 1 and (is_plain_report(file_path) or is_zip_archive(file_path)):
+            started = time.perf_counter()
+            specimens_data = parse_specimens_parallel(file_path, workers, progress, grammar)
+            if timings is not None:
+                timings.add('parallel parse', time.perf_counter() - started)
+        else:
+            # Create a dictionary to store all information by specimen ID
+            specimens_data = {}
+            sized = not file_path.lower().endswith(UNSIZED_EXTENSIONS)
+            for record in BACKENDS[backend](file_path, timings=timings, grammar=grammar):
+                if progress:
+                    progress(min(record['offset'], total) if sized else None, total)
+                if timings is not None:
+                    started = time.perf_counter()
+                merge_specimen(specimens_data, record)
+                if timings is not None:
+                    timings.add('merge', time.perf_counter() - started)
+        if cache:
+            started = time.perf_counter()
+            cache.put(file_path, specimens_data)
+            if timings is not None:
+                timings.add('cache', time.perf_counter() - started)
+    if cache:
+        cache.save()
+
+    if progress:
+        progress(total, total)
+
+    if timings is not None:
+        timings.count(total, len(specimens_data))
+    return specimens_data
+
+
+def throttle_progress(progress, interval=PROGRESS_INTERVAL):
+    """Wrap a progress(position, total) callback so it is not called for every specimen.
+
+    A report is passed on only when the whole percentage has moved and at
+    least interval seconds have passed since the last one. The final report
+    (position == total) always goes through. Reports without a position
+    (None, for compressed files) are passed on every interval seconds.
+    """
+    last_time = None
+    last_percent = None
+
+    def report(position, total):
+        nonlocal last_time, last_percent
+        now = time.monotonic()
+        if position is None:
+            if last_time is None or now - last_time >= interval:
+                last_time = now
+                progress(None, total)
+            return
+        percent = position * 100 // total if total else 100
+        if position >= total or (percent != last_percent and (last_time is None or now - last_time >= interval)):
+            last_time, last_percent = now, percent
+            progress(position, total)
+
+    return report
+
+
+def parse_lab_results(file_path, progress=None, backend='stream', workers=1, cache=None, timings=None,
+                      grammar=DEFAULT_GRAMMAR):
+    """Parse lab results from the text file and extract relevant information.
+
+    Returns one output row per specimen; see parse_specimens for the options.
+    """
+    return specimens_to_results(parse_specimens(file_path, progress, backend, workers, cache, timings, grammar))
+
+
+def read_new_records(file_path, checkpoint=0, final=False, grammar=DEFAULT_GRAMMAR):
+    """Parse the sections completed since the byte offset checkpoint.
+
+    Returns (records, checkpoint): the new section records in file order and
+    the offset to resume from. The section at the end of the file may still
+    be being written, so it is held back until the next specimen marker
+    follows it, unless final is true. Duplicate specimen IDs are not merged.
+    """
+    size = os.path.getsize(file_path)
+    if final:
+        end = size
+    else:
+        with open(file_path, 'rb') as file:
+            end = find_last_split_point(file, checkpoint, size, grammar)
+    if end is None or end <= checkpoint:
+        return [], checkpoint
+    return list(iter_chunk_records(file_path, checkpoint, end, grammar)), end
@@ -1,110 +1,39 @@
-import re
-import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
+from lab_export import RESULT_COLUMNS, export_results
+from lab_parser import iter_results, parse_lab_results, parse_specimens
 
 def extract_lab_data(file_path):
-    # Read the file
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        content = file.read()
-    
-    # Split the content into separate lab reports if multiple exist
-    reports = re.split(r'(?=RUN DATE:)', content)
-    
-    # Prepare a list to store extracted data
-    data = []
-    
-    # Process each report
-    for report in reports:
-        if not report.strip():
-            continue
-            
-        # Extract run date
-        run_date_match = re.search(r'RUN DATE:\s*(\d{2}/\d{2}/\d{2})', report)
-        run_date = run_date_match.group(1) if run_date_match else ""
-        
-        # Extract sample ID
-        sample_id_match = re.search(r'SPEC #:\s*([^\s]+)', report)
-        sample_id = sample_id_match.group(1) if sample_id_match else ""
-        
-        # Extract age/sex
-        age_sex_match = re.search(r'AGE/SEX:\s*([^\s]+)', report)
-        age_sex = age_sex_match.group(1) if age_sex_match else ""
-        
-        # Extract completion date-time
-        comp_datetime_match = re.search(r'COMP:\s*(\d{2}/\d{2}/\d{2}-\d{4})', report)
-        comp_datetime = comp_datetime_match.group(1) if comp_datetime_match else ""
-        
-        # Extract all test results
-        test_pattern = r'([A-Za-z][A-Za-z\s\d\-]+(?:PCR|Result|Vir|Virus|Panel Interp))\s+Final\s+([^\n]+)'
-        test_results = re.findall(test_pattern, report)
-        
-        # Check if any pathogens were detected
-        detected_pathogens = []
-        
-        for test_name, result in test_results:
-            if "Detected" in result and "Not Detected" not in result:
-                # Clean up the test name to get the pathogen name
-                pathogen = test_name.strip()
-                detected_pathogens.append(pathogen)
-        
-        # Also check for panel interpretation which might have more specific information
-        interp_match = re.search(r'Respiratory PCR Panel Interp\s+Final\s+([^\n]+)', report)
-        if interp_match:
-            interp_text = interp_match.group(1).strip()
-            if "DETECTED" in interp_text:
-                detected_pathogens.append(interp_text)
-        
-        # Determine the result
-        if detected_pathogens:
-            # Use the first detected pathogen as the result
-            result = detected_pathogens[0]
-        else:
-            result = "Not detected"
-        
-        # Add the data to our list
-        data.append({
-            'Date': run_date,
-            'Sample ID #': sample_id,
-            'Age': age_sex,
-            'COMP DATE-Time': comp_datetime,
-            'Result': result
-        })
-    
-    # Create a DataFrame
-    df = pd.DataFrame(data)
-    
-    # Remove duplicates based on Sample ID
-    df = df.drop_duplicates(subset=['Sample ID #'])
-    
-    return df
+    # pandas is only needed here, so it isn't loaded before the window opens
+    import pandas as pd
+
+    # Parse with the shared parser core, so this matches the command line and PyQt tools
+    return pd.DataFrame(parse_lab_results(file_path), columns=RESULT_COLUMNS)
 
 def process_file():
     # Ask user to select file
     file_path = filedialog.askopenfilename(
         title="Select the lab report text file",
-        filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        filetypes=[("Text Files", "*.txt"), ("Compressed Reports", "*.gz *.xz *.bz2 *.zip"), ("All Files", "*.*")]
     )
     
     if not file_path:
         return
     
     try:
-        df = extract_lab_data(file_path)
-        
         # Ask user where to save the Excel file
         output_path = filedialog.asksaveasfilename(
             title="Save Excel File",
             defaultextension=".xlsx",
-            filetypes=[("Excel Files", "*.xlsx")]
+            filetypes=[("Excel Files", "*.xlsx"), ("CSV Files", "*.csv")]
         )
         
         if not output_path:
             return
         
-        # Export to Excel
-        df.to_excel(output_path, index=False)
+        # Export rows as they are extracted, without building a DataFrame
+        export_results(iter_results(parse_specimens(file_path)), output_path)
         
         messagebox.showinfo("Success", f"Data has been extracted and saved to:\n{output_path}")
 
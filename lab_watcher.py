@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from lab_export import CsvWriter
+from lab_parser import is_plain_report, iter_results, merge_specimen, read_new_records, report_stat
+from parse_lab_results import expand_inputs, parse_file_for_batch
+from report_grammar import DEFAULT_GRAMMAR, load_grammar
+
+# Seconds between scans of the watched directories
+WATCH_INTERVAL = 2.0
+# Seconds a file's size and mtime must stay unchanged before it is treated as completely written
+SETTLE_SECONDS = 5.0
+# Recent files kept for the latency figures in the metrics
+LATENCY_WINDOW = 100
+
+
+def parse_appended(file_path, checkpoint, grammar=DEFAULT_GRAMMAR):
+    """Parse the specimens a report gained since the byte offset checkpoint (None for a new report).
+
+    Returns its specimens_data, the seconds it took and the checkpoint to
+    resume from. The report has settled, so its last section is taken as
+    complete, as follow mode does. Reports that can't have been appended to
+    (compressed ones, zip members, and files that shrank) are refused with a
+    ValueError, since their earlier rows are already written.
+    """
+    started = time.perf_counter()
+    if not is_plain_report(file_path):
+        if checkpoint is not None:
+            raise ValueError("changed after it was processed, and compressed or zipped reports can't be appended to")
+        specimens_data, seconds, _ = parse_file_for_batch(file_path, grammar=grammar)
+        # Only marks the report as processed, since it can't be resumed
+        return specimens_data, seconds, report_stat(file_path).st_size
+    if checkpoint is not None and os.path.getsize(file_path) < checkpoint:
+        raise ValueError("shrank after it was processed, so it was rewritten rather than appended to")
+
+    records, checkpoint = read_new_records(file_path, checkpoint or 0, final=True, grammar=grammar)
+    specimens_data = {}
+    for record in records:
+        merge_specimen(specimens_data, record)
+    return specimens_data, time.perf_counter() - started, checkpoint
+
+
+class CsvSink:
+    """Append the specimens of each processed file to a CSV file.
+
+    Rows can't be taken back out of the CSV, so a file processed again after
+    it changed only has the specimens appended since last time written (see
+    parse_appended).
+    """
+
+    # The watcher parses only what each file gained since it was last processed
+    appends_only = True
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, file_path, specimens_data):
+        writer = CsvWriter(self.path, append=True)
+        try:
+            for row in iter_results(specimens_data):
+                writer.write_row(row)
+        finally:
+            writer.close()
+
+    def close(self):
+        pass
+
+
+class StoreSink:
+    """Merge the specimens of each processed file into a SQLite specimen store.
+
+    A file processed again after it changed replaces what it contributed
+    before, so a report that keeps growing is never counted twice.
+    """
+
+    appends_only = False
+
+    def __init__(self, path):
+        self.path = path
+        self.store = None
+
+    def write(self, file_path, specimens_data):
+        # Opened on first use, in the sink thread, since SQLite connections stay on their own thread
+        if self.store is None:
+            from specimen_store import SpecimenStore
+            self.store = SpecimenStore(self.path)
+        self.store.add(specimens_data, file_path)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+class WatchMetrics:
+    """Counters for the metrics endpoint."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.files_processed = 0
+        self.files_failed = 0
+        self.specimens = 0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.last_error = None
+
+    def snapshot(self, queue_depth, in_progress):
+        uptime = time.time() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'queue_depth': queue_depth,
+            'in_progress': in_progress,
+            'files_processed': self.files_processed,
+            'files_failed': self.files_failed,
+            'specimens': self.specimens,
+            'bytes': self.bytes,
+            'specimens_per_second': round(self.specimens / uptime, 2) if uptime else 0,
+            # From the file settling to its results being written, over the last LATENCY_WINDOW files
+            'latency_seconds': {
+                'last': round(self.latencies[-1], 3) if latencies else None,
+                'median': round(latencies[len(latencies) // 2], 3) if latencies else None,
+                'max': round(latencies[-1], 3) if latencies else None,
+            },
+            'parse_specimens_per_second': round(self.specimens / self.parse_seconds) if self.parse_seconds else None,
+            'last_error': self.last_error,
+        }
+
+
+class DropFolderWatcher:
+    """Watch directories for new reports and parse each one as soon as it has been completely written.
+
+    Directories are polled every interval seconds. A file is queued once its
+    size and mtime have not changed for settle seconds, parsed on a pool of
+    jobs worker processes, and its specimens handed to the sink. Processed
+    files are recorded in state_path, so a restart picks up where it left off;
+    a file that changes after being processed is processed again, in full for
+    the store and from where it was left for a CSV file.
+    """
+
+    def __init__(self, directories, sink, state_path, jobs=1, interval=WATCH_INTERVAL,
+                 settle=SETTLE_SECONDS, recursive=False, backend='stream', grammar=DEFAULT_GRAMMAR):
+        self.directories = directories
+        self.sink = sink
+        self.state_path = state_path
+        self.jobs = jobs
+        self.interval = interval
+        self.settle = settle
+        self.recursive = recursive
+        self.backend = backend
+        self.grammar = grammar
+        # path -> (size, mtime_ns) when last processed, and the byte offset parsed up to for append-only sinks
+        self.processed, self.checkpoints = self._load_state()
+        self.candidates = {}   # path -> (size, mtime_ns, time the signature was first seen unchanged)
+        self.queued = set()
+        self.in_progress = 0
+        self.queue = asyncio.Queue()
+        self.metrics = WatchMetrics()
+        self.stopping = asyncio.Event()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return {}, {}
+        processed = {path: tuple(entry[:2]) for path, entry in state.items()}
+        checkpoints = {path: entry[2] for path, entry in state.items() if len(entry) > 2}
+        return processed, checkpoints
+
+    def _save_state(self):
+        state = {
+            path: list(signature) + ([self.checkpoints[path]] if path in self.checkpoints else [])
+            for path, signature in self.processed.items()
+        }
+        with open(self.state_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def scan(self):
+        """Queue every file that has settled since the last scan."""
+        now = time.monotonic()
+        for path in expand_inputs(self.directories, recursive=self.recursive):
+            try:
+                stat = report_stat(path)
+            except OSError:
+                # Removed between listing and stat
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if path in self.queued or self.processed.get(path) == signature:
+                continue
+
+            candidate = self.candidates.get(path)
+            if candidate is None or candidate[:2] != signature:
+                # New or still being written; wait for it to settle
+                self.candidates[path] = signature + (now,)
+            elif now - candidate[2] >= self.settle:
+                del self.candidates[path]
+                self.queued.add(path)
+                self.queue.put_nowait((path, signature, time.monotonic()))
+
+    async def watch(self):
+        while not self.stopping.is_set():
+            self.scan()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def worker(self, pool, sink_executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            path, signature, queued_at = await self.queue.get()
+            self.in_progress += 1
+            try:
+                if self.sink.appends_only:
+                    parse = partial(parse_appended, path, self.checkpoints.get(path), self.grammar)
+                    specimens_data, seconds, checkpoint = await loop.run_in_executor(pool, parse)
+                else:
+                    parse = partial(parse_file_for_batch, path, self.backend, grammar=self.grammar)
+                    specimens_data, seconds, _ = await loop.run_in_executor(pool, parse)
+                # A single sink thread keeps writes in order and off the event loop
+                await loop.run_in_executor(sink_executor, self.sink.write, path, specimens_data)
+                if self.sink.appends_only:
+                    self.checkpoints[path] = checkpoint
+            except Exception as e:
+                self.metrics.files_failed += 1
+                self.metrics.last_error = f"{path}: {type(e).__name__}: {e}"
+                print(f"Failed: {self.metrics.last_error}", file=sys.stderr)
+            else:
+                self.metrics.files_processed += 1
+                self.metrics.specimens += len(specimens_data)
+                self.metrics.bytes += signature[0]
+                self.metrics.parse_seconds += seconds
+                self.metrics.latencies.append(time.monotonic() - queued_at + self.settle)
+                print(f"Parsed {path}: {len(specimens_data)} specimens in {seconds:.3f}s")
+            finally:
+                # Failed files are recorded too, so a bad file isn't retried until it changes
+                self.processed[path] = signature
+                self._save_state()
+                self.queued.discard(path)
+                self.in_progress -= 1
+                self.queue.task_done()
+
+    async def handle_http(self, reader, writer):
+        """Serve GET /health and GET /metrics as JSON."""
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path == '/health':
+                status, body = '200 OK', {'status': 'ok'}
+            elif path == '/metrics':
+                status, body = '200 OK', self.metrics.snapshot(self.queue.qsize(), self.in_progress)
+            else:
+                status, body = '404 Not Found', {'error': 'not found'}
+            content = json.dumps(body).encode('utf-8')
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode('latin-1') + content)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self, host='127.0.0.1', port=None):
+        """Watch and process until stop() is called."""
+        server = None
+        if port is not None:
+            server = await asyncio.start_server(self.handle_http, host, port)
+            print(f"Metrics at http://{host}:{port}/metrics")
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool, ThreadPoolExecutor(max_workers=1) as sink_executor:
+            workers = [asyncio.create_task(self.worker(pool, sink_executor)) for _ in range(self.jobs)]
+            try:
+                await self.watch()
+                # Finish what is already queued before shutting down
+                await self.queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                if server is not None:
+                    server.close()
+                    await server.wait_closed()
+                await asyncio.get_running_loop().run_in_executor(sink_executor, self.sink.close)
+
+    def stop(self):
+        self.stopping.set()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Watch drop folders and parse lab reports as soon as they are written.")
+    parser.add_argument('directories', nargs='+', help="directories to watch for .txt reports")
+    sink = parser.add_mutually_exclusive_group(required=True)
+    sink.add_argument('-o', '--output', help="CSV file to append each report's results to")
+    sink.add_argument('--store', help="SQLite specimen store to merge each report's results into")
+    parser.add_argument('--state', help="file recording processed reports (default: next to the output or store)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="reports parsed at once (default: one per CPU)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="also watch subdirectories")
+    parser.add_argument('--grammar', help="JSON or YAML report layout to parse instead of the BioFire default")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help="seconds between scans (default: %(default)s)")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help="seconds a report must stay unchanged before it is parsed (default: %(default)s)")
+    parser.add_argument('--host', default='127.0.0.1', help="address for the health/metrics endpoint (default: %(default)s)")
+    parser.add_argument('--port', type=int, help="serve GET /health and GET /metrics on this port")
+    return parser
+
+
+async def serve(args):
+    sink = CsvSink(args.output) if args.output else StoreSink(args.store)
+    state_path = args.state or os.path.splitext(args.output or args.store)[0] + "_watch_state.json"
+    watcher = DropFolderWatcher(args.directories, sink, state_path, jobs=args.jobs, interval=args.interval,
+                                settle=args.settle, recursive=args.recursive, grammar=args.grammar)
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, watcher.stop)
+        except (NotImplementedError, RuntimeError):
+            # Not supported on Windows event loops; Ctrl+C still ends the run
+            pass
+
+    print(f"Watching {', '.join(args.directories)}")
+    await watcher.run(args.host, args.port)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    missing = [directory for directory in args.directories if not os.path.isdir(directory)]
+    if missing:
+        print(f"Not a directory: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    if args.jobs < 1:
+        print("--jobs takes a positive number.", file=sys.stderr)
+        return 2
+    try:
+        args.grammar = load_grammar(args.grammar) if args.grammar else DEFAULT_GRAMMAR
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f"Can't load grammar {args.grammar}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
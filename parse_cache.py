@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import time
+from lab_parser import open_report_binary, report_stat, specimens_from_json, specimens_to_json, split_zip_member
+
+# Default cap on the total size of cached results
+DEFAULT_MAX_BYTES = 512 << 20
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(file_path):
+    """Return the BLAKE2b hex digest of the file's content (the decompressed content, for a zip member)."""
+    digest = hashlib.blake2b(digest_size=20)
+    if split_zip_member(file_path)[1] is not None:
+        # Members are hashed on their own, so changing one member of an archive doesn't invalidate the others
+        file = open_report_binary(file_path)
+    else:
+        file = open(file_path, 'rb')
+    with file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """On-disk cache of parsed specimen data, keyed on each file's size, mtime and content hash.
+
+    A file whose size and mtime are unchanged is served without being read.
+    If only its mtime changed, the content hash decides. Results are stored
+    once per distinct content and evicted least recently used first once
+    their total size passes max_bytes. The whole cache is discarded when the
+    parser version changes.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, directory, version, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self.dirty = False
+        # Stat and digest of files looked up but not yet stored, so put() needn't hash them again
+        self.pending = {}
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX_NAME), 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = None
+
+        if not index or index.get('version') != self.version:
+            # Results written by another parser version may differ; start over
+            self.clear()
+            return self.index
+        return index
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, digest + '.json')
+
+    def clear(self):
+        """Remove every cached result."""
+        # Only touch files this cache wrote, in case the directory is shared
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if name == self.INDEX_NAME or (ext == '.json' and len(stem) == 40 and all(c in '0123456789abcdef' for c in stem)):
+                os.remove(os.path.join(self.directory, name))
+        self.index = {'version': self.version, 'files': {}, 'blobs': {}}
+        self.dirty = True
+
+    def get(self, file_path):
+        """Return the cached specimens_data for file_path, or None if it must be parsed."""
+        key = os.path.abspath(file_path)
+        stat = report_stat(file_path)
+        entry = self.index['files'].get(key)
+
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            digest = entry['digest']
+        else:
+            digest = file_digest(file_path)
+            self.pending[key] = (stat.st_size, stat.st_mtime_ns, digest)
+
+        blob = self.index['blobs'].get(digest)
+        if blob is None:
+            return None
+
+        try:
+            with open(self._blob_path(digest), 'r', encoding='utf-8') as file:
+                specimens_data = specimens_from_json(json.load(file))
+        except (OSError, ValueError):
+            self._drop_blob(digest)
+            return None
+
+        self.index['files'][key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+        self.pending.pop(key, None)
+        blob['last_used'] = time.time()
+        self.dirty = True
+        return specimens_data
+
+    def put(self, file_path, specimens_data):
+        """Store the specimens_data parsed from file_path."""
+        key = os.path.abspath(file_path)
+        if key in self.pending:
+            size, mtime_ns, digest = self.pending.pop(key)
+        else:
+            stat = report_stat(file_path)
+            size, mtime_ns, digest = stat.st_size, stat.st_mtime_ns, file_digest(file_path)
+
+        blob_path = self._blob_path(digest)
+        with open(blob_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(specimens_to_json(specimens_data), file)
+        os.replace(blob_path + '.tmp', blob_path)
+
+        self.index['blobs'][digest] = {'bytes': os.path.getsize(blob_path), 'last_used': time.time()}
+        self.index['files'][key] = {'size': size, 'mtime_ns': mtime_ns, 'digest': digest}
+        self.dirty = True
+
+    def _drop_blob(self, digest):
+        self.index['blobs'].pop(digest, None)
+        for key in [key for key, entry in self.index['files'].items() if entry['digest'] == digest]:
+            del self.index['files'][key]
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+        self.dirty = True
+
+    def _evict(self):
+        blobs = self.index['blobs']
+        total = sum(blob['bytes'] for blob in blobs.values())
+        if total <= self.max_bytes:
+            return
+        for digest in sorted(blobs, key=lambda digest: blobs[digest]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= blobs[digest]['bytes']
+            self._drop_blob(digest)
+
+    def save(self):
+        """Evict down to max_bytes and write the index to disk if anything changed."""
+        self._evict()
+        if not self.dirty:
+            return
+        index_path = os.path.join(self.directory, self.INDEX_NAME)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.index, file)
+        os.replace(index_path + '.tmp', index_path)
+        self.dirty = False
@@ -1,112 +1,541 @@
-import re
-import pandas as pd
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import groupby
 from pathlib import Path
+from lab_export import WRITERS, CsvWriter, export_results
+# parse_lab_results and parse_specimens are re-exported for existing callers of this module
+from lab_parser import (BACKENDS, PARALLEL_CHUNKS_PER_WORKER, PARSER_VERSION, SpecimenRecord, is_plain_report,
+                        is_zip_archive, iter_results, merge_specimens, parse_lab_results, parse_specimens,
+                        read_new_records, report_size, report_sizes, shared_zip, specimen_result, zip_archive_of,
+                        zip_members)
+from parse_cache import DEFAULT_MAX_BYTES, ParseCache
+from parse_profile import StageTimings, profiled
+from report_grammar import DEFAULT_GRAMMAR, load_grammar
+from specimen_shards import MAX_SHARDS, ShardedSpecimens
 
-def parse_lab_results(file_path):
-    """Parse lab results from the text file and extract relevant information."""
-    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-        content = file.read()
-    
-    # Create a dictionary to store all information by specimen ID
-    specimens_data = {}
-    
-    # Find all instances of specimen IDs (both SPEC #: and Specimen: formats)
-    specimen_matches = re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content)
-    
-    for match in specimen_matches:
-        sample_id = match.group(1)
-        start_pos = match.start()
-        
-        # If this is the first time we see this specimen ID, initialize its data
-        if sample_id not in specimens_data:
-            specimens_data[sample_id] = {
-                'run_date': "Unknown",
-                'age_sex': "Unknown",
-                'comp_date_time': "Unknown",
-                'detected_tests': []
-            }
-            
-        # Extract section from this match to the next one (or end of file)
-        section_end = len(content)
-        for other_match in re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content[start_pos + 1:]):
-            section_end = start_pos + 1 + other_match.start()
-            break
-            
-        section = content[start_pos:section_end]
-        
-        # Find RUN DATE near this specimen
-        run_date_match = re.search(r'RUN DATE:\s*(\S+)', content[max(0, start_pos-1000):start_pos])
-        if not run_date_match:
-            run_date_match = re.search(r'RUN DATE:\s*(\S+)', section)
-            
-        if run_date_match and specimens_data[sample_id]['run_date'] == "Unknown":
-            specimens_data[sample_id]['run_date'] = run_date_match.group(1)
-            
-        # Extract Age/Sex
-        age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', content[max(0, start_pos-1000):start_pos])
-        if not age_sex_match:
-            age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', section)
-            
-        if age_sex_match and specimens_data[sample_id]['age_sex'] == "Unknown":
-            specimens_data[sample_id]['age_sex'] = age_sex_match.group(1)
-            
-        # Extract Completion Date/Time
-        comp_match = re.search(r'COMP:\s*(\S+)', section)
-        if comp_match and specimens_data[sample_id]['comp_date_time'] == "Unknown":
-            specimens_data[sample_id]['comp_date_time'] = comp_match.group(1)
-            
-        # Find detected tests in this section
-        lines = section.split('\n')
-        for i in range(len(lines) - 1):
-            line = lines[i].strip()
-            
-            # Check if this is a test result line (contains "Final")
-            if "Final" in line and not line.startswith("---"):
-                # Extract the test name (everything before "Final")
-                test_name = line.split("Final")[0].strip()
-                
-                # Get the next line which should contain the result
-                result_line = lines[i+1].strip() if i+1 < len(lines) else ""
-                
-                # Check if the result is "Detected" (but not "Not Detected")
-                if "Detected" in result_line and "Not Detected" not in result_line:
-                    specimens_data[sample_id]['detected_tests'].append(test_name)
-    
-    # Convert the dictionary to the list of results
-    results = []
-    for sample_id, data in specimens_data.items():
-        # Create result entry
-        result = {
-            "Date": data['run_date'],
-            "Sample ID #": sample_id,
-            "Age": data['age_sex'],
-            "COMP DATE-Time": data['comp_date_time'],
-            "Result": "Not detected" if not data['detected_tests'] else "; ".join([f"{test}: Detected" for test in data['detected_tests']])
-        }
-        results.append(result)
-    
-    return results
-
-def main():
-    # Path to your text file
-    file_path = "baba.txt"
-    
-    # Parse the lab results
-    results = parse_lab_results(file_path)
-    
-    # Create a DataFrame
-    df = pd.DataFrame(results)
-    
-    # Write to Excel
-    excel_path = "lab_results.xlsx"
-    df.to_excel(excel_path, index=False)
-    
-    print(f"Results exported to {excel_path}")
-    print(f"Found {len(results)} specimens.")
-    if results:
+# Seconds between checks for new data in follow mode
+FOLLOW_INTERVAL = 5.0
+# Seconds a followed report must go unmodified before its last specimen is treated as complete
+FOLLOW_SETTLE = 60.0
+# Reports picked up from directories: plain or compressed .txt files, and zip archives of them
+REPORT_PATTERNS = ['*.txt', '*.txt.gz', '*.txt.xz', '*.txt.bz2', '*.zip']
+
+
+def load_checkpoint(state_path, file_path):
+    """Return the saved follow offset for file_path, or 0 if it was truncated or replaced."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return 0
+
+    stat = os.stat(file_path)
+    if state.get('path') != os.path.abspath(file_path) or state.get('inode') != stat.st_ino:
+        return 0
+    if state.get('offset', 0) > stat.st_size:
+        return 0
+    return state['offset']
+
+
+def save_checkpoint(state_path, file_path, checkpoint):
+    state = {'path': os.path.abspath(file_path), 'inode': os.stat(file_path).st_ino, 'offset': checkpoint}
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def follow_lab_records(file_path, state_path, interval=FOLLOW_INTERVAL, once=False, settle=FOLLOW_SETTLE,
+                       final=False, grammar=DEFAULT_GRAMMAR):
+    """Yield lists of new section records as a report grows, checkpointing after each.
+
+    The checkpoint in state_path is saved once the consumer has handled a
+    batch, so a crash replays at most that batch. Only the bytes appended
+    since the last complete section are read on each pass. The last section
+    has no later specimen marker to close it, so it is held back until the
+    file has gone unmodified for settle seconds (or right away with
+    final=True); then it is yielded and the checkpoint moves to the end of
+    the file.
+    """
+    checkpoint = load_checkpoint(state_path, file_path)
+    while True:
+        stat = os.stat(file_path)
+        if stat.st_size < checkpoint:
+            # The file was truncated or rotated; start over
+            checkpoint = 0
+        finished = final or time.time() - stat.st_mtime >= settle
+        records, checkpoint = read_new_records(file_path, checkpoint, final=finished, grammar=grammar)
+        if records:
+            yield records
+        save_checkpoint(state_path, file_path, checkpoint)
+        if once:
+            return
+        time.sleep(interval)
+
+
+def follow(args):
+    """Run the CLI in follow mode: append each newly completed specimen to a CSV file."""
+    if len(args.inputs) != 1 or not os.path.isfile(args.inputs[0]) or not is_plain_report(args.inputs[0]):
+        print("--follow takes exactly one uncompressed report file.", file=sys.stderr)
+        return 2
+    file_path = args.inputs[0]
+    output = args.output or "lab_results.csv"
+    state_path = args.state or os.path.splitext(output)[0] + "_checkpoint.json"
+
+    try:
+        for records in follow_lab_records(file_path, state_path, interval=args.interval, once=args.once,
+                                          settle=args.settle, final=args.final, grammar=args.grammar):
+            writer = CsvWriter(output, append=True)
+            try:
+                for record in records:
+                    writer.write_row(specimen_result(record['sample_id'], SpecimenRecord.from_section(record)))
+            finally:
+                writer.close()
+            print(f"Appended {len(records)} new specimens to {output}")
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def expand_inputs(inputs, recursive=False):
+    """Expand files, glob patterns and directories into a list of report paths.
+
+    Directories contribute their REPORT_PATTERNS files. Zip archives expand
+    into one "archive.zip::member.txt" path per report inside, so members are
+    parsed (and cached and stored) separately. Paths are returned in the order
+    given, sorted within each pattern or directory, without duplicates.
+    """
+    paths = []
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            prefix = '**/' if recursive else ''
+            matches = sorted({str(path) for pattern in REPORT_PATTERNS
+                              for path in Path(item).glob(prefix + pattern) if path.is_file()})
+        elif glob.has_magic(item):
+            matches = sorted(path for path in glob.glob(item, recursive=recursive) if os.path.isfile(path))
+        else:
+            matches = [item]
+        for path in matches:
+            for report in expand_archive(path):
+                if report not in seen:
+                    seen.add(report)
+                    paths.append(report)
+    return paths
+
+
+def expand_archive(path):
+    """Return the member report paths of a zip archive, or [path] for anything else."""
+    if not is_zip_archive(path) or not os.path.isfile(path):
+        return [path]
+    import zipfile
+
+    try:
+        return zip_members(path)
+    except (OSError, zipfile.BadZipFile):
+        # Kept as is, so the failure is reported in the manifest
+        return [path]
+
+
+def read_targets(path):
+    """Read a panel's target names from a text file, one per line; blank lines are skipped."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def parse_file_for_batch(file_path, backend='stream', timed=False, grammar=DEFAULT_GRAMMAR, workers=1):
+    """Parse one file of a batch; returns its specimens_data, the seconds it took and its StageTimings (if timed).
+
+    With workers > 1 a large file is split across that many processes (see parse_specimens).
+    """
+    started = time.perf_counter()
+    timings = StageTimings() if timed else None
+    specimens_data = parse_specimens(file_path, backend=backend, workers=workers, timings=timings, grammar=grammar)
+    return specimens_data, time.perf_counter() - started, timings
+
+
+def shard_file_for_batch(file_path, writer, backend='stream', timed=False, grammar=DEFAULT_GRAMMAR):
+    """Stream one file's section records into a ShardWriter instead of merging them in memory.
+
+    Returns the number of sections, the seconds it took and its StageTimings (if timed).
+    """
+    started = time.perf_counter()
+    timings = StageTimings() if timed else None
+    try:
+        count = writer.add_records(BACKENDS[backend](file_path, timings=timings, grammar=grammar))
+        writer.flush()
+    except BaseException:
+        writer.discard()
+        raise
+    if timings is not None:
+        timings.count(report_size(file_path), count)
+    return count, time.perf_counter() - started, timings
+
+
+def run_batch_group(archive, calls):
+    """Run the batch calls of several files in turn, with their zip archive (if any) opened once for all of them.
+
+    Returns (result, None) or (None, error message) for each call, so one bad
+    member doesn't fail the rest of its group.
+    """
+    outcomes = []
+    with shared_zip(archive) if archive else nullcontext():
+        for function, args in calls:
+            try:
+                outcomes.append((function(*args), None))
+            except Exception as e:
+                outcomes.append((None, f"{type(e).__name__}: {e}"))
+    return outcomes
+
+
+def batch_groups(paths, jobs=None):
+    """Split a batch into (archive, paths) groups, each run by one worker.
+
+    Members of a zip archive are grouped in runs, so a worker opens the
+    archive once per run rather than once per member; every other file is a
+    group of its own, with archive None.
+    """
+    workers = jobs or os.cpu_count() or 1
+    groups = []
+    for archive, group in groupby(paths, key=zip_archive_of):
+        group = list(group)
+        if archive is None:
+            groups.extend((None, [path]) for path in group)
+        else:
+            step = -(-len(group) // (workers * PARALLEL_CHUNKS_PER_WORKER))
+            groups.extend((archive, group[i:i + step]) for i in range(0, len(group), step))
+    return groups
+
+
+def timed_stage(timings, stage):
+    """Time the body of a with statement as stage when timings are being recorded."""
+    return timings.stage(stage) if timings is not None else nullcontext()
+
+
+def parse_batch(paths, jobs=None, backend='stream', cache=None, timings=None, grammar=DEFAULT_GRAMMAR, shards=None,
+                split_workers=1):
+    """Parse many files on a pool of worker processes.
+
+    Yields (path, manifest_entry, specimens_data) in input order. A file that
+    fails is reported in its manifest entry (status 'error') with
+    specimens_data None, and the rest of the batch carries on. With a
+    ParseCache, unchanged files are served from it and never reach the pool.
+    With a ShardedSpecimens, workers stream each file's records into it
+    rather than merging them, so no file is ever held in memory; the
+    manifest entry then counts sections and specimens_data is None. With
+    jobs=1 files are parsed in this process, one at a time. With
+    split_workers > 1 files are also parsed one at a time, each large one
+    split across split_workers processes, so process pools are never nested;
+    shards are written unsplit. With a StageTimings, the stage timings of
+    every file are added to it.
+    """
+    cached = {}
+    if cache:
+        started = time.perf_counter()
+        for archive, group in groupby(paths, key=zip_archive_of):
+            try:
+                with shared_zip(archive) if archive else nullcontext():
+                    for path in group:
+                        try:
+                            specimens_data = cache.get(path)
+                        except (OSError, KeyError):
+                            # Missing or unreadable; let the worker report it
+                            continue
+                        if specimens_data is not None:
+                            cached[path] = specimens_data
+            except Exception:
+                # An archive that can't be opened; its members fail when they are parsed
+                continue
+        if timings is not None:
+            timings.add('cache', time.perf_counter() - started)
+            for specimens_data in cached.values():
+                timings.count(0, len(specimens_data))
+
+    timed = timings is not None
+    if split_workers > 1:
+        jobs = 1
+    # Writers are made in input order, the order their parts must be adopted in
+    writers = {path: shards.writer() for path in paths} if shards is not None else {}
+
+    def job(path):
+        if path in writers:
+            return shard_file_for_batch, (path, writers[path], backend, timed, grammar)
+        return parse_file_for_batch, (path, backend, timed, grammar, split_workers)
+
+    sizes = report_sizes(paths)
+    groups = batch_groups([path for path in paths if path not in cached], jobs)
+    group_of = {path: number for number, (_, group) in enumerate(groups) for path in group}
+    # Outcomes of groups that have been run, by path, until each is yielded
+    outcomes = {}
+    with ProcessPoolExecutor(max_workers=jobs) if jobs != 1 else nullcontext() as pool:
+        if pool is not None:
+            futures = [pool.submit(run_batch_group, archive, [job(path) for path in group]) for archive, group in groups]
+        for path in paths:
+            entry = {'path': path}
+            if path in cached:
+                specimens_data = cached.pop(path)
+                entry.update(bytes=sizes.get(path, 0), status='ok', cached=True, specimens=len(specimens_data), seconds=0)
+                yield path, entry, specimens_data
+                continue
+
+            if path not in outcomes:
+                number = group_of[path]
+                archive, group = groups[number]
+                try:
+                    if pool is None:
+                        results = run_batch_group(archive, [job(path) for path in group])
+                    else:
+                        results = futures[number].result()
+                        futures[number] = None
+                except Exception as e:
+                    # The whole group failed, e.g. its worker process died
+                    results = [(None, f"{type(e).__name__}: {e}")] * len(group)
+                outcomes.update(zip(group, results))
+            outcome, error = outcomes.pop(path)
+            try:
+                entry['bytes'] = sizes[path] if path in sizes else report_size(path)
+            except Exception as e:
+                error = error or f"{type(e).__name__}: {e}"
+            if error is not None:
+                if path in writers:
+                    # In case the worker died before it could clean up
+                    writers[path].discard()
+                entry.update(status='error', error=error)
+                yield path, entry, None
+                continue
+            result, seconds, file_timings = outcome
+            if timed:
+                timings.merge(file_timings)
+            if path in writers:
+                started = time.perf_counter()
+                shards.adopt(writers[path])
+                if timed:
+                    timings.add('shard', time.perf_counter() - started)
+                entry.update(status='ok', cached=False, sections=result, seconds=round(seconds, 3))
+                yield path, entry, None
+                continue
+
+            specimens_data = result
+            if cache:
+                started = time.perf_counter()
+                cache.put(path, specimens_data)
+                if timed:
+                    timings.add('cache', time.perf_counter() - started)
+            entry.update(status='ok', cached=False, specimens=len(specimens_data), seconds=round(seconds, 3))
+            yield path, entry, specimens_data
+
+    if cache:
+        cache.save()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Parse lab result text reports into a single Excel, CSV, Parquet or Arrow file."
+    )
+    parser.add_argument('inputs', nargs='+', help="report files, glob patterns or directories of .txt files")
+    parser.add_argument('-o', '--output', help="combined output file (default: lab_results.xlsx, or lab_results.csv with --follow)")
+    parser.add_argument('-f', '--format', choices=sorted(WRITERS), help="output format (default: from the output file extension)")
+    parser.add_argument('--matrix', action='store_true', help="write one True/False column per detected target instead of the Result column")
+    parser.add_argument('--targets', help="text file listing the panel's targets, one per line, to use as the --matrix columns "
+                                          "(default: the grammar's panel, else every target detected)")
+    parser.add_argument('-m', '--manifest', help="where to write the JSON manifest (default: next to the output)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="files parsed at once (default: one per CPU)")
+    parser.add_argument('--split-workers', type=int,
+                        help="processes each large file is split across, parsing files one at a time "
+                             "(default: the -j processes when there are fewer files than them, else 1)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="search directories and ** patterns recursively")
+    parser.add_argument('--grammar', help="JSON or YAML report layout to parse instead of the BioFire default (see report_grammar.py)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='stream', help="how each file is read; mmap is neither faster nor smaller than stream and is kept for benchmarking (default: %(default)s)")
+    parser.add_argument('--cache-dir', help="reuse results for unchanged files from this cache directory")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES >> 20, help="cache size cap in MB (default: %(default)s)")
+    parser.add_argument('--store', help="merge results into this SQLite specimen store and export the whole store; files already stored are skipped")
+    parser.add_argument('--shards', type=int, help="merge duplicate specimens on disk across this many temporary shards instead of in memory, for inputs too large to merge in memory")
+    parser.add_argument('--since', type=datetime.fromisoformat, help="with --store, export only specimens first stored at or after this ISO date/time")
+    parser.add_argument('--timings', help="write per-stage timings, throughput and peak memory to this JSON file ('-' logs them to stderr)")
+    parser.add_argument('--profile', help="profile the run with cProfile in a single process and save the stats to this file")
+    parser.add_argument('--follow', action='store_true', help="keep watching one growing report and append new specimens to a CSV output")
+    parser.add_argument('--state', help="follow mode checkpoint file (default: next to the output)")
+    parser.add_argument('--interval', type=float, default=FOLLOW_INTERVAL, help="follow mode polling interval in seconds (default: %(default)s)")
+    parser.add_argument('--once', action='store_true', help="in follow mode, process what is new and exit")
+    parser.add_argument('--settle', type=float, default=FOLLOW_SETTLE,
+                        help="in follow mode, seconds the report must go unmodified before its last specimen is appended (default: %(default)s)")
+    parser.add_argument('--final', action='store_true', help="in follow mode, treat the report as complete and append its last specimen now")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.grammar = load_grammar(args.grammar) if args.grammar else DEFAULT_GRAMMAR
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f"Can't load grammar {args.grammar}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 2
+    if args.follow:
+        return follow(args)
+    if args.profile:
+        # Parse in this process so the profile covers the parsing as well
+        args.jobs = args.split_workers = 1
+        with profiled(args.profile):
+            return batch(args)
+    return batch(args)
+
+
+def batch(args):
+    """Run the CLI in batch mode: parse every input and write one combined output."""
+    args.output = args.output or "lab_results.xlsx"
+
+    paths = expand_inputs(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("No input files found.", file=sys.stderr)
+        return 1
+
+    if args.targets and not args.matrix:
+        print("--targets needs --matrix.", file=sys.stderr)
+        return 2
+    targets = args.grammar.panel
+    if args.targets:
+        try:
+            targets = read_targets(args.targets)
+        except OSError as e:
+            print(f"Can't read targets {args.targets}: {e}", file=sys.stderr)
+            return 2
+    if (args.jobs is not None and args.jobs < 1) or (args.split_workers is not None and args.split_workers < 1):
+        print("--jobs and --split-workers take a positive number.", file=sys.stderr)
+        return 2
+    if args.since and not args.store:
+        print("--since needs --store.", file=sys.stderr)
+        return 2
+    if args.shards is not None and (args.store or args.matrix or args.cache_dir or not 1 <= args.shards <= MAX_SHARDS):
+        # The store already merges on disk, the matrix is built in memory anyway, and cached results are whole files
+        print(f"--shards takes a number from 1 to {MAX_SHARDS} and can't be combined with --store, --matrix or --cache-dir.",
+              file=sys.stderr)
+        return 2
+
+    store = None
+    skipped = []
+    if args.store:
+        from specimen_store import SpecimenStore
+        try:
+            store = SpecimenStore(args.store)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        for archive, group in groupby(paths, key=zip_archive_of):
+            try:
+                with shared_zip(archive) if archive else nullcontext():
+                    stored = []
+                    for path in group:
+                        try:
+                            if store.contains_file(path):
+                                stored.append(path)
+                        except Exception:
+                            # Missing, unreadable or not a report; let the parse report it
+                            pass
+            except Exception:
+                # An archive that can't be opened; its members fail when they are parsed
+                continue
+            for path in stored:
+                skipped.append({'path': path, 'status': 'skipped', 'reason': 'already stored'})
+                print(f"Already stored {path}")
+        paths = [path for path in paths if path not in {entry['path'] for entry in skipped}]
+
+    manifest_path = args.manifest or os.path.splitext(args.output)[0] + "_manifest.json"
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    timings = StageTimings() if args.timings else None
+
+    # Files are merged in input order, so duplicates across files follow the same first-seen rules
+    shards = ShardedSpecimens(args.shards) if args.shards else None
+    specimens_data = shards if shards is not None else {}
+    entries = list(skipped)
+    # Results parsed with another grammar must not be served for this one
+    version = PARSER_VERSION if args.grammar is DEFAULT_GRAMMAR else f"{PARSER_VERSION}-{args.grammar.fingerprint}"
+    cache = ParseCache(args.cache_dir, version, max_bytes=args.cache_max_mb << 20) if args.cache_dir else None
+    split_workers = args.split_workers
+    if split_workers is None:
+        # With fewer files than processes, the processes left over split the files instead
+        jobs = args.jobs or os.cpu_count() or 1
+        split_workers = jobs if len(paths) < jobs else 1
+    for path, entry, file_specimens in parse_batch(paths, jobs=args.jobs, backend=args.backend, cache=cache,
+                                                   timings=timings, grammar=args.grammar, shards=shards,
+                                                   split_workers=split_workers):
+        entries.append(entry)
+        if entry['status'] == 'error':
+            print(f"Failed: {path}: {entry['error']}", file=sys.stderr)
+            continue
+        if shards is not None:
+            # The worker has already written the file's records to the shards
+            print(f"Parsed {path}: {entry['sections']} sections in {entry['seconds']}s")
+            continue
+        if store is not None:
+            with timed_stage(timings, 'store'):
+                store.add(file_specimens, path)
+        else:
+            with timed_stage(timings, 'merge files'):
+                merge_specimens(specimens_data, file_specimens)
+        if entry['cached']:
+            print(f"Cached {path}: {entry['specimens']} specimens")
+        else:
+            print(f"Parsed {path}: {entry['specimens']} specimens in {entry['seconds']}s")
+
+    if store is not None:
+        since = args.since.timestamp() if args.since else None
+        with timed_stage(timings, 'store'):
+            specimens_data = store.specimens(since=since)
+        store.close()
+
+    if args.matrix:
+        from detection_matrix import detection_matrix, export_matrix
+        with timed_stage(timings, 'detection matrix'):
+            matrix = detection_matrix(specimens_data, targets=targets)
+        with timed_stage(timings, 'export'):
+            export_matrix(matrix, args.output, args.format)
+        count = len(matrix)
+    else:
+        # Rows are written as they are produced, without building a DataFrame first
+        with timed_stage(timings, 'export'):
+            count = export_results(iter_results(specimens_data), args.output, args.format)
+
+    parsed = sum(1 for entry in entries if entry['status'] == 'ok')
+    failed = sum(1 for entry in entries if entry['status'] == 'error')
+    manifest = {
+        'output': args.output,
+        'files': entries,
+        'files_parsed': parsed,
+        'files_failed': failed,
+        'specimens': count,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+
+    print(f"Results exported to {args.output}")
+    print(f"Found {count} specimens in {parsed} of {len(entries)} files.")
+    print(f"Manifest written to {manifest_path}")
+    if timings is not None:
+        if args.timings == '-':
+            logging.basicConfig(level=logging.INFO, format='%(name)s %(message)s')
+            timings.log()
+        else:
+            timings.write_json(args.timings)
+            print(f"Timings written to {args.timings}")
+    if specimens_data:
         print("First result example:")
-        for key, value in results[0].items():
+        for key, value in next(iter_results(specimens_data)).items():
             print(f"{key}: {value}")
+    if shards is not None:
+        shards.close()
+
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
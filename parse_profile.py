@@ -0,0 +1,121 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak memory is then left out of reports
+    resource = None
+
+logger = logging.getLogger('lab_parser.timings')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children in MB, or None if unknown."""
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / (1 << 20)
+
+
+class StageTimings:
+    """Wall time per stage of a parse-and-export run, for finding where a slow run spends its time.
+
+    The parser and CLI call add() for each timed step; stages are reported in
+    the order they were first seen. Runs from several processes are combined
+    with merge().
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.bytes = 0
+        self.specimens = 0
+
+    def add(self, stage, seconds):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, bytes, specimens):
+        """Record that a file of bytes bytes yielded specimens specimens."""
+        self.bytes += bytes
+        self.specimens += specimens
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the body of a with statement as stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def merge(self, other):
+        """Fold in the stages of another StageTimings, e.g. one returned by a worker process."""
+        for stage, (seconds, calls) in other.stages.items():
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        self.bytes += other.bytes
+        self.specimens += other.specimens
+
+    def report(self):
+        """Return the timings as a JSON-serialisable dict."""
+        wall = time.perf_counter() - self.started
+        peak = peak_rss_mb()
+        return {
+            'wall_seconds': round(wall, 4),
+            'bytes': self.bytes,
+            'specimens': self.specimens,
+            'specimens_per_second': round(self.specimens / wall) if wall else None,
+            'mb_per_second': round(self.bytes / wall / (1 << 20), 2) if wall else None,
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+            # Stages can overlap (parallel workers) or nest, so they need not add up to wall_seconds
+            'stages': {
+                stage: {'seconds': round(seconds, 4), 'calls': calls}
+                for stage, (seconds, calls) in self.stages.items()
+            },
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def log(self):
+        """Emit the report as one key=value log line per stage and a summary line."""
+        report = self.report()
+        for stage, entry in report['stages'].items():
+            logger.info('stage="%s" seconds=%.4f calls=%d', stage, entry['seconds'], entry['calls'])
+        logger.info('wall_seconds=%.4f bytes=%d specimens=%d specimens_per_second=%s peak_rss_mb=%s',
+                    report['wall_seconds'], report['bytes'], report['specimens'],
+                    report['specimens_per_second'], report['peak_rss_mb'])
+
+
+@contextmanager
+def profiled(path, top=25):
+    """Run the body of a with statement under cProfile and save the stats to path.
+
+    The top functions by cumulative time are also printed to stderr. Only
+    code in this process is profiled, not worker processes.
+    """
+    # Imported here so runs without --profile don't pay for them at startup
+    import cProfile
+    import pstats
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(top)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+
+# Fields a grammar can capture; SpecimenRecord and the output columns are built around them
+FIELDS = ('run_date', 'age_sex', 'comp_date_time')
+# What follows a field marker (after any whitespace), unless the grammar gives its own pattern
+DEFAULT_VALUE_PATTERN = r'\S+'
+
+# The BioFire FilmArray layout the parser was written for, and the default grammar
+BIOFIRE_GRAMMAR = {
+    'name': 'BioFire FilmArray',
+    # A specimen's section runs from one of these markers, followed by its ID, to the next
+    'specimen': ['SPEC #:', 'Specimen:'],
+    'fields': {
+        # Header fields belong to the specimens printed after them, so they are looked for in the
+        # header_lookbehind characters before the specimen marker first, and in its section second
+        'run_date': {'markers': ['RUN DATE:'], 'header': True},
+        'age_sex': {'markers': ['AGE/SEX:'], 'header': True},
+        'comp_date_time': {'markers': ['COMP:']},
+    },
+    # A test line names the test and holds the status marker; the line after it is the result.
+    # Lines starting with skip_prefix are never test lines.
+    'tests': {'status': 'Final', 'skip_prefix': '---', 'detected': 'Detected', 'not_detected': 'Not Detected'},
+    'header_lookbehind': 1000,
+    # Optionally, 'panel': the panel's target names, used as the detection matrix columns in this order
+}
+
+# Patterns and tokens of a grammar, for text (str) or memory-mapped (bytes) scans
+GrammarPatterns = namedtuple('GrammarPatterns', [
+    'specimen', 'boundary', 'headers', 'section', 'section_groups',
+    'newline', 'status', 'skip_prefix', 'detected', 'not_detected',
+])
+
+
+def marker_alternative(marker, rest):
+    """Match marker followed by rest while consuming only the marker's first character.
+
+    Consuming one character keeps overlapping matches (a marker inside another
+    field's value) visible to the next search, exactly as searching for each
+    field on its own would, and lets the regex engine skip ahead to the
+    first characters of the alternatives.
+    """
+    return re.escape(marker[0]) + '(?=' + re.escape(marker[1:]) + rest + ')'
+
+
+def is_text_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def check_spec(spec):
+    """Raise ValueError unless spec has the shape of a grammar, before any of it is read."""
+    if not isinstance(spec, dict):
+        raise ValueError(f"A grammar must be a mapping of settings, not {type(spec).__name__}")
+    if 'specimen' not in spec:
+        raise ValueError("A grammar needs a 'specimen' list of markers")
+    if not is_text_list(spec['specimen']):
+        raise ValueError("The grammar's 'specimen' setting must be a list of markers")
+    lookbehind = spec.get('header_lookbehind', 0)
+    if not isinstance(lookbehind, int) or isinstance(lookbehind, bool) or lookbehind < 0:
+        raise ValueError("The grammar's 'header_lookbehind' setting must be a whole number of characters")
+    for key in ('fields', 'tests'):
+        if not isinstance(spec.get(key, {}), dict):
+            raise ValueError(f"The grammar's {key!r} setting must be a mapping")
+    for token, value in spec.get('tests', {}).items():
+        if not isinstance(value, str):
+            raise ValueError(f"The test setting {token!r} must be text")
+    for field, definition in spec.get('fields', {}).items():
+        if not isinstance(definition, dict):
+            raise ValueError(f"Field {field!r} must be a mapping with a 'markers' list")
+        if not is_text_list(definition.get('markers', [])):
+            raise ValueError(f"The markers of field {field!r} must be a list of text")
+        value = definition.get('value', DEFAULT_VALUE_PATTERN)
+        if not isinstance(value, str):
+            raise ValueError(f"The value pattern of {field!r} must be text")
+        try:
+            groups = re.compile(value).groups
+        except re.error as e:
+            raise ValueError(f"The value pattern of {field!r} is not a valid regular expression: {e}") from None
+        if groups:
+            raise ValueError(f"The value pattern of {field!r} must not contain capturing groups")
+    panel = spec.get('panel')
+    if panel is not None and not (isinstance(panel, list) and all(isinstance(target, str) and target for target in panel)):
+        raise ValueError("The grammar's 'panel' setting must be a list of target names")
+
+
+class ReportGrammar:
+    """A report layout (see BIOFIRE_GRAMMAR) compiled into the patterns the parser scans with.
+
+    Every field marker and the test status marker are folded into a single
+    alternation, so each specimen's section is scanned once however many
+    fields the layout defines. Grammars can be written as dicts or loaded
+    from JSON or YAML files with load_grammar.
+    """
+
+    def __init__(self, spec):
+        check_spec(spec)
+        self.spec = spec
+        self.name = spec.get('name', 'custom')
+        self.specimen_markers = list(spec['specimen'])
+        self.lookbehind = spec.get('header_lookbehind', BIOFIRE_GRAMMAR['header_lookbehind'])
+        self.fields = spec.get('fields', {})
+        self.tests = dict(BIOFIRE_GRAMMAR['tests'], **spec.get('tests', {}))
+        # Target columns for the detection matrix; None means every target detected
+        self.panel = spec.get('panel')
+        self._validate()
+
+        # Longest specimen marker; a marker this close to the end of the text may still be completed
+        self.max_marker_length = max(len(marker) for marker in self.specimen_markers)
+        # Bytes read before a parallel chunk to recover its lookbehind (UTF-8 is at most 4 bytes a char)
+        self.context_bytes = self.lookbehind * 4 + 16
+        try:
+            self.text = self._compile(str)
+            self.bytes = self._compile(bytes)
+        except re.error as e:
+            # e.g. a value pattern with inline flags, valid on its own but not inside the combined pattern
+            raise ValueError(f"The grammar's patterns can't be combined: {e}") from None
+
+        markers = b'|'.join(re.escape(marker.encode('utf-8')) for marker in self.specimen_markers)
+        # A specimen marker at the start of a line, followed by a plain ASCII specimen ID
+        self.split_candidate = re.compile(rb'[\r\n](?:' + markers + rb')[ \t\n\r\x0b\x0c]*[\x21-\x7e]')
+        self.specimen_markers_bytes = tuple(marker.encode('utf-8') for marker in self.specimen_markers)
+        # Identifies the grammar in cache keys, since another grammar gives other results for the same file
+        self.fingerprint = hashlib.blake2b(json.dumps(spec, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+    def _validate(self):
+        if not self.specimen_markers or not all(self.specimen_markers):
+            raise ValueError("A grammar needs at least one non-empty specimen marker")
+        for field, definition in self.fields.items():
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field {field!r}; expected one of {', '.join(FIELDS)}")
+            if not definition.get('markers') or not all(definition['markers']):
+                raise ValueError(f"Field {field!r} needs at least one non-empty marker")
+        if not self.tests['status']:
+            raise ValueError("The test status marker must not be empty")
+
+    def _compile(self, kind):
+        def build(pattern):
+            return re.compile(pattern if kind is str else pattern.encode('utf-8'))
+
+        def token(text):
+            return text if kind is str else text.encode('utf-8')
+
+        specimen = '|'.join(re.escape(marker) for marker in self.specimen_markers)
+        headers = []
+        alternatives = []
+        # Group number -> field captured by it; None for the result line of a test
+        section_groups = [None]
+        for field, definition in self.fields.items():
+            value = r'\s*(' + definition.get('value', DEFAULT_VALUE_PATTERN) + ')'
+            markers = definition['markers']
+            if definition.get('header'):
+                pattern = '(?:' + '|'.join(re.escape(marker) for marker in markers) + ')' + value
+                headers.append((field, build(pattern), tuple(token(marker) for marker in markers)))
+            for marker in markers:
+                alternatives.append(marker_alternative(marker, value))
+                section_groups.append(field)
+
+        # The result is the line after the first status marker on a test line
+        alternatives.append(marker_alternative(self.tests['status'], r'[^\n]*\n([^\n]*)'))
+        section_groups.append(None)
+
+        return GrammarPatterns(
+            specimen=build(r'(?:' + specimen + r')\s*(\S+)'),
+            # Zero-width so overlapping candidates are kept, exactly like rescanning from start_pos + 1
+            boundary=build(r'(?=(?:' + specimen + r')\s*\S)'),
+            headers=headers,
+            section=build('|'.join(alternatives)),
+            section_groups=tuple(section_groups),
+            newline=token('\n'),
+            status=token(self.tests['status']),
+            skip_prefix=token(self.tests['skip_prefix']),
+            detected=token(self.tests['detected']),
+            not_detected=token(self.tests['not_detected']),
+        )
+
+    def patterns(self, binary=False):
+        return self.bytes if binary else self.text
+
+    def __reduce__(self):
+        # Rebuilt from the spec in worker processes rather than pickling compiled patterns
+        return ReportGrammar, (self.spec,)
+
+
+def load_grammar(path):
+    """Load a ReportGrammar from a JSON or YAML (needs PyYAML) file."""
+    with open(path, 'r', encoding='utf-8') as file:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            import yaml
+            try:
+                spec = yaml.safe_load(file)
+            except yaml.YAMLError as e:
+                raise ValueError(f"Not valid YAML: {e}") from None
+        else:
+            spec = json.load(file)
+    return ReportGrammar(spec)
+
+
+DEFAULT_GRAMMAR = ReportGrammar(BIOFIRE_GRAMMAR)
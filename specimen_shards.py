@@ -0,0 +1,188 @@
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+from lab_parser import SpecimenRecord
+
+# Temporary shards specimens are spread over; only one shard's specimens are held in memory at a time
+DEFAULT_SHARDS = 64
+# Every shard is open at once while the merged shards are interleaved, so keep well inside the fd limit
+MAX_SHARDS = 256
+# Bytes of lines a ShardWriter buffers before appending them to its shard files
+SHARD_BUFFER_BYTES = 4 << 20
+
+
+def shard_path(directory, shard, part=None, merged=False):
+    if merged:
+        return os.path.join(directory, f"{shard}.merged.jsonl")
+    if part is None:
+        return os.path.join(directory, f"{shard}.jsonl")
+    return os.path.join(directory, f"{shard}.part{part}.jsonl")
+
+
+class ShardWriter:
+    """Spread the specimens of one input (one part) over shard files by Sample ID.
+
+    Lines are buffered and appended a shard at a time, so at most one file is
+    open however many shards there are. Writers are picklable, so a worker
+    process can fill one; the parts are then taken in by ShardedSpecimens.adopt().
+    """
+
+    def __init__(self, directory, shards, part):
+        self.directory = directory
+        self.shards = shards
+        self.part = part
+        self.sequence = 0
+        self.buffers = {}
+        self.buffered = 0
+
+    def _write(self, sample_id, fields):
+        # crc32 rather than hash(), which changes from process to process for strings
+        shard = zlib.crc32(sample_id.encode('utf-8')) % self.shards
+        line = json.dumps([self.part, self.sequence, sample_id] + fields, separators=(',', ':')) + '\n'
+        self.buffers.setdefault(shard, []).append(line)
+        self.buffered += len(line)
+        self.sequence += 1
+        if self.buffered >= SHARD_BUFFER_BYTES:
+            self.flush()
+
+    def add(self, specimens_data):
+        """Add the specimens of a specimens_data mapping."""
+        for sample_id, data in specimens_data.items():
+            self._write(sample_id, data.to_json())
+
+    def add_records(self, records):
+        """Add section records as they are produced, e.g. by iter_lab_records; returns how many there were."""
+        count = 0
+        for record in records:
+            self._write(record['sample_id'], [record['run_date'], record['age_sex'], record['comp_date_time'],
+                                              list(record['detected_tests'])])
+            count += 1
+        return count
+
+    def flush(self):
+        for shard, lines in self.buffers.items():
+            with open(shard_path(self.directory, shard, self.part), 'a', encoding='utf-8') as file:
+                file.writelines(lines)
+        self.buffers = {}
+        self.buffered = 0
+
+    def discard(self):
+        """Remove everything written for this part, e.g. after its input failed to parse."""
+        self.buffers = {}
+        self.buffered = 0
+        for shard in range(self.shards):
+            path = shard_path(self.directory, shard, self.part)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ShardedSpecimens:
+    """Merge specimens on disk instead of in one dict, for inputs too large to merge in memory.
+
+    Each input is written by its own ShardWriter (a part), which
+    hash-partitions its specimens or section records by Sample ID into
+    temporary shard files, numbered in input order. Once every part has been
+    adopted, each shard is merged on its own with the parser's rules and the
+    merged shards are interleaved back into first-seen order, so items()
+    yields the same specimens, in the same order, as merge_specimens over the
+    same inputs would. Memory is bounded by the size of a shard rather than
+    the number of specimens; use more shards (up to MAX_SHARDS) for larger
+    inputs.
+    """
+
+    def __init__(self, shards=DEFAULT_SHARDS, directory=None):
+        if not 1 <= shards <= MAX_SHARDS:
+            raise ValueError(f"The number of shards must be between 1 and {MAX_SHARDS}")
+        self.temporary = tempfile.TemporaryDirectory(prefix='lab_shards_', dir=directory)
+        self.directory = self.temporary.name
+        self.shards = shards
+        self.parts = 0
+        self.count = None
+
+    def writer(self):
+        """Return a ShardWriter for the next input; parts must be adopted in the order their writers were made."""
+        if self.count is not None:
+            raise ValueError("Specimens cannot be added once they have been merged")
+        writer = ShardWriter(self.directory, self.shards, self.parts)
+        self.parts += 1
+        return writer
+
+    def adopt(self, writer):
+        """Take in the shard files a (flushed) writer has filled, after those of every earlier writer."""
+        for shard in range(self.shards):
+            path = shard_path(self.directory, shard, writer.part)
+            if os.path.exists(path):
+                with open(path, 'rb') as source, open(shard_path(self.directory, shard), 'ab') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(path)
+
+    def add(self, specimens_data):
+        """Add the specimens of a specimens_data mapping, e.g. one parsed file of a batch."""
+        writer = self.writer()
+        writer.add(specimens_data)
+        writer.flush()
+        self.adopt(writer)
+
+    def add_records(self, records):
+        """Add section records, as produced by iter_lab_records, without merging them in memory."""
+        writer = self.writer()
+        count = writer.add_records(records)
+        writer.flush()
+        self.adopt(writer)
+        return count
+
+    def merge(self):
+        """Merge each shard on its own; called by items() and len() if needed."""
+        if self.count is not None:
+            return
+
+        self.count = 0
+        for shard in range(self.shards):
+            merged = {}
+            path = shard_path(self.directory, shard)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        part, sequence, sample_id, *fields = json.loads(line)
+                        entry = merged.get(sample_id)
+                        if entry is None:
+                            merged[sample_id] = (part, sequence, SpecimenRecord(*fields))
+                        else:
+                            entry[2].merge(SpecimenRecord(*fields))
+                os.remove(path)
+
+            # Lines were adopted in input order, so the merged shard is already in first-seen order
+            with open(shard_path(self.directory, shard, merged=True), 'w', encoding='utf-8') as file:
+                for sample_id, (part, sequence, data) in merged.items():
+                    file.write(json.dumps([part, sequence, sample_id] + data.to_json(), separators=(',', ':')) + '\n')
+            self.count += len(merged)
+
+    def _iter_merged_shard(self, shard):
+        with open(shard_path(self.directory, shard, merged=True), 'r', encoding='utf-8') as file:
+            for line in file:
+                yield json.loads(line)
+
+    def items(self):
+        """Yield (sample_id, SpecimenRecord) for every specimen, merged and in first-seen order."""
+        self.merge()
+        shards = [self._iter_merged_shard(shard) for shard in range(self.shards)]
+        for part, sequence, sample_id, *fields in heapq.merge(*shards, key=lambda entry: entry[:2]):
+            yield sample_id, SpecimenRecord(*fields)
+
+    def __len__(self):
+        self.merge()
+        return self.count
+
+    def close(self):
+        """Remove the temporary shards."""
+        self.temporary.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
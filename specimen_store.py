@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import time
+from itertools import groupby
+
+from lab_parser import SpecimenRecord, report_stat
+from parse_cache import file_digest
+
+# Specimens written per executemany call inside a transaction
+STORE_BATCH_SIZE = 10000
+# Separator for detected test names in the detected_tests column (names never span lines)
+TEST_SEPARATOR = '\n'
+# Bump whenever the tables change; stores written with another layout are refused rather than misread
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS specimens (
+    sample_id TEXT PRIMARY KEY,
+    run_date TEXT NOT NULL,
+    age_sex TEXT NOT NULL,
+    comp_date_time TEXT NOT NULL,
+    detected_tests TEXT NOT NULL,
+    first_stored REAL NOT NULL,
+    last_updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS specimens_run_date ON specimens (run_date);
+CREATE INDEX IF NOT EXISTS specimens_first_stored ON specimens (first_stored);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digest TEXT,
+    stored REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sources_digest ON sources (digest);
+CREATE TABLE IF NOT EXISTS contributions (
+    source_id INTEGER NOT NULL REFERENCES sources (id),
+    sample_id TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    age_sex TEXT NOT NULL,
+    comp_date_time TEXT NOT NULL,
+    detected_tests TEXT NOT NULL,
+    PRIMARY KEY (source_id, sample_id)
+);
+CREATE INDEX IF NOT EXISTS contributions_sample_id ON contributions (sample_id, source_id);
+"""
+
+# Merged specimens replace the stored ones; first_stored is kept so --since and first-seen order hold
+UPSERT = """
+INSERT INTO specimens (sample_id, run_date, age_sex, comp_date_time, detected_tests, first_stored, last_updated)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (sample_id) DO UPDATE SET
+    run_date = excluded.run_date,
+    age_sex = excluded.age_sex,
+    comp_date_time = excluded.comp_date_time,
+    detected_tests = excluded.detected_tests,
+    last_updated = excluded.last_updated
+"""
+
+SELECT_COLUMNS = "SELECT sample_id, run_date, age_sex, comp_date_time, detected_tests FROM specimens"
+
+
+class SpecimenStore:
+    """SQLite store of merged specimens that persists across runs.
+
+    Specimens are indexed on Sample ID and run date and kept in the order
+    they were first stored. Each file's specimens are kept as that file's
+    contribution, and the stored specimens are merged from the contributions
+    with the parser's rules, in the order files were first added. Adding a
+    file again (e.g. after the LIS appended to it) replaces its earlier
+    contribution instead of merging it twice. Every add is one transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Stat and digest of files checked by contains_file but not yet added, so add() needn't hash them again
+        self.pending = {}
+        self.connection = sqlite3.connect(path)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        tables = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if tables and version != SCHEMA_VERSION:
+            self.connection.close()
+            raise ValueError(f"{path} was written by another version of the specimen store; rebuild it from the reports")
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def contains_file(self, file_path):
+        """Check whether file_path, or another file with the same content, has already been added."""
+        key = os.path.abspath(file_path)
+        stat = report_stat(file_path)
+        row = self.connection.execute('SELECT size, mtime_ns FROM sources WHERE path = ?', (key,)).fetchone()
+        if row == (stat.st_size, stat.st_mtime_ns):
+            return True
+        digest = file_digest(file_path)
+        self.pending[key] = (stat.st_size, stat.st_mtime_ns, digest)
+        return self.connection.execute('SELECT 1 FROM sources WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def add(self, specimens_data, file_path=None):
+        """Merge specimens_data into the store as the contribution of file_path, if given.
+
+        A file added before keeps its place in the merge order, and its
+        previous contribution is replaced. Everything is written in a single
+        transaction, so an interrupted add leaves the store as it was.
+        """
+        now = time.time()
+        with self.connection:
+            source_id, previous = self._source(file_path, now)
+            self.connection.execute('DELETE FROM contributions WHERE source_id = ?', (source_id,))
+            rows = (
+                (source_id, sample_id, data.run_date, data.age_sex, data.comp_date_time,
+                 TEST_SEPARATOR.join(data.detected_tests))
+                for sample_id, data in specimens_data.items()
+            )
+            for batch in batches(rows):
+                self.connection.executemany(
+                    'INSERT INTO contributions (source_id, sample_id, run_date, age_sex, comp_date_time, detected_tests)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)', batch
+                )
+
+            # New specimens are stored in the file's order; ones the file no longer has are merged again without it
+            affected = list(specimens_data)
+            affected.extend(sample_id for sample_id in previous if sample_id not in specimens_data)
+            self._remerge(affected, now)
+
+    def _source(self, file_path, now):
+        """Return the source id for file_path (a new one if None) and the Sample IDs it contributed before."""
+        if file_path is None:
+            cursor = self.connection.execute('INSERT INTO sources (stored) VALUES (?)', (now,))
+            return cursor.lastrowid, []
+
+        key = os.path.abspath(file_path)
+        stat = report_stat(file_path)
+        pending = self.pending.pop(key, None)
+        if pending is not None and pending[:2] == (stat.st_size, stat.st_mtime_ns):
+            digest = pending[2]
+        else:
+            digest = file_digest(file_path)
+        fields = (stat.st_size, stat.st_mtime_ns, digest, now)
+        row = self.connection.execute('SELECT id FROM sources WHERE path = ?', (key,)).fetchone()
+        if row is None:
+            cursor = self.connection.execute(
+                'INSERT INTO sources (path, size, mtime_ns, digest, stored) VALUES (?, ?, ?, ?, ?)', (key,) + fields
+            )
+            return cursor.lastrowid, []
+
+        source_id = row[0]
+        self.connection.execute(
+            'UPDATE sources SET size = ?, mtime_ns = ?, digest = ?, stored = ? WHERE id = ?', fields + (source_id,)
+        )
+        previous = [sample_id for sample_id, in self.connection.execute(
+            'SELECT sample_id FROM contributions WHERE source_id = ?', (source_id,)
+        )]
+        return source_id, previous
+
+    def _remerge(self, sample_ids, now):
+        """Rebuild the stored specimens for sample_ids from their contributions."""
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS affected (position INTEGER PRIMARY KEY, sample_id TEXT)')
+        self.connection.execute('DELETE FROM temp.affected')
+        for batch in batches((sample_id,) for sample_id in sample_ids):
+            self.connection.executemany('INSERT INTO temp.affected (sample_id) VALUES (?)', batch)
+
+        rows = self.connection.execute("""
+            SELECT a.sample_id, c.run_date, c.age_sex, c.comp_date_time, c.detected_tests
+            FROM temp.affected a JOIN contributions c ON c.sample_id = a.sample_id
+            ORDER BY a.position, c.source_id
+        """)
+        merged = (
+            merge_contributions(sample_id, contributions) + (now, now)
+            for sample_id, contributions in groupby(rows, key=lambda row: row[0])
+        )
+        for batch in batches(merged):
+            self.connection.executemany(UPSERT, batch)
+
+        self.connection.execute("""
+            DELETE FROM specimens WHERE sample_id IN (SELECT sample_id FROM temp.affected)
+            AND NOT EXISTS (SELECT 1 FROM contributions c WHERE c.sample_id = specimens.sample_id)
+        """)
+
+    def get(self, sample_id):
+        """Return the SpecimenRecord stored for sample_id, or None."""
+        row = self.connection.execute(SELECT_COLUMNS + ' WHERE sample_id = ?', (sample_id,)).fetchone()
+        return None if row is None else record_from_row(row)[1]
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM specimens').fetchone()[0]
+
+    def specimens(self, since=None, run_date=None):
+        """Return stored specimens as specimens_data, in the order they were first stored.
+
+        since (a Unix timestamp) keeps only specimens first stored at or after
+        it; run_date keeps only those run on that date.
+        """
+        conditions, parameters = [], []
+        if since is not None:
+            conditions.append('first_stored >= ?')
+            parameters.append(since)
+        if run_date is not None:
+            conditions.append('run_date = ?')
+            parameters.append(run_date)
+
+        query = SELECT_COLUMNS
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY rowid'
+        return dict(record_from_row(row) for row in self.connection.execute(query, parameters))
+
+
+def batches(rows, size=STORE_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge_contributions(sample_id, rows):
+    """Merge one specimen's contribution rows, in source order, with the parser's rules."""
+    run_date = age_sex = comp_date_time = "Unknown"
+    tests = []
+    for _, row_run_date, row_age_sex, row_comp_date_time, row_tests in rows:
+        # The first non-Unknown value of each field wins and detected tests accumulate
+        if run_date == "Unknown":
+            run_date = row_run_date
+        if age_sex == "Unknown":
+            age_sex = row_age_sex
+        if comp_date_time == "Unknown":
+            comp_date_time = row_comp_date_time
+        if row_tests:
+            tests.append(row_tests)
+    return sample_id, run_date, age_sex, comp_date_time, TEST_SEPARATOR.join(tests)
+
+
+def record_from_row(row):
+    sample_id, run_date, age_sex, comp_date_time, detected_tests = row
+    tests = detected_tests.split(TEST_SEPARATOR) if detected_tests else ()
+    return sample_id, SpecimenRecord(run_date, age_sex, comp_date_time, tests)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules live at the top of the repository rather than in a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLE_REPORT = os.path.join(ROOT, 'sample_lab_report.txt')
@@ -0,0 +1,32 @@
+import lab_parser
+from conftest import SAMPLE_REPORT
+from parse_lab_results import main
+
+
+def test_split_workers_split_a_single_file_with_the_same_output(tmp_path, monkeypatch):
+    # Small enough that the sample report is worth splitting
+    monkeypatch.setattr(lab_parser, 'PARALLEL_MIN_CHUNK_SIZE', 1)
+    split = []
+    parse_specimens_parallel = lab_parser.parse_specimens_parallel
+
+    def recorded(file_path, workers, *args, **kwargs):
+        split.append(workers)
+        return parse_specimens_parallel(file_path, workers, *args, **kwargs)
+
+    monkeypatch.setattr(lab_parser, 'parse_specimens_parallel', recorded)
+    serial, parallel = tmp_path / 'serial.csv', tmp_path / 'split.csv'
+
+    assert main([SAMPLE_REPORT, '-j', '1', '--split-workers', '1', '-o', str(serial)]) == 0
+    assert split == []
+    assert main([SAMPLE_REPORT, '--split-workers', '2', '-o', str(parallel)]) == 0
+    assert split == [2]
+    assert parallel.read_text() == serial.read_text()
+
+
+def test_spare_jobs_split_the_files(tmp_path, monkeypatch):
+    split = []
+    monkeypatch.setattr(lab_parser, 'parse_specimens_parallel',
+                        lambda file_path, workers, *args, **kwargs: split.append(workers) or {})
+
+    assert main([SAMPLE_REPORT, '-j', '3', '-o', str(tmp_path / 'out.csv')]) == 0
+    assert split == [3]
@@ -0,0 +1,71 @@
+import bz2
+import gzip
+import json
+import lzma
+import zipfile
+
+import pytest
+
+from conftest import SAMPLE_REPORT
+from lab_parser import ZIP_MEMBER_SEPARATOR, merge_specimens, parse_specimens
+from parse_lab_results import main
+
+OTHER_REPORT = ("RUN DATE: 02/01/25\nSPEC #: S2025001\nAGE/SEX: 45/M\n"
+                "RSV                                Final\n                                   Detected\n"
+                "SPEC #: S2025009\nAGE/SEX: 70/F\nCOMP: 02/01/25-0900\n")
+
+
+def sample_bytes():
+    with open(SAMPLE_REPORT, 'rb') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('extension, module', [('.gz', gzip), ('.xz', lzma), ('.bz2', bz2)])
+def test_compressed_report_parses_like_the_plain_one(tmp_path, extension, module):
+    path = tmp_path / ('report.txt' + extension)
+    path.write_bytes(module.compress(sample_bytes()))
+
+    assert parse_specimens(str(path)) == parse_specimens(SAMPLE_REPORT)
+
+
+def test_zip_members_and_whole_archive_parse_like_plain_files(tmp_path):
+    other = tmp_path / 'other.txt'
+    other.write_text(OTHER_REPORT)
+    archive = str(tmp_path / 'reports.zip')
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.write(SAMPLE_REPORT, 'sample.txt')
+        zip_file.write(other, 'other.txt')
+    expected = parse_specimens(SAMPLE_REPORT)
+    merge_specimens(expected, parse_specimens(str(other)))
+
+    assert parse_specimens(archive + ZIP_MEMBER_SEPARATOR + 'sample.txt') == parse_specimens(SAMPLE_REPORT)
+    assert parse_specimens(archive) == expected
+    assert parse_specimens(archive, workers=2) == expected
+
+
+def test_truncated_gzip_is_an_error_in_the_manifest(tmp_path):
+    good = tmp_path / 'good.txt.gz'
+    good.write_bytes(gzip.compress(sample_bytes()))
+    truncated = tmp_path / 'truncated.txt.gz'
+    truncated.write_bytes(good.read_bytes()[:-20])
+    manifest = tmp_path / 'manifest.json'
+
+    status = main([str(good), str(truncated), '-o', str(tmp_path / 'out.csv'), '-m', str(manifest), '-j', '1'])
+
+    assert status == 1
+    entries = {entry['path']: entry for entry in json.loads(manifest.read_text())['files']}
+    assert entries[str(good)]['status'] == 'ok'
+    assert entries[str(truncated)]['status'] == 'error'
+    assert 'EOFError' in entries[str(truncated)]['error']
+
+
+def test_compressed_report_still_calls_progress_while_parsing(tmp_path):
+    # The GUI checks for Cancel inside the progress callback, so it must run before the end
+    path = tmp_path / 'report.txt.gz'
+    path.write_bytes(gzip.compress(sample_bytes()))
+    calls = []
+
+    parse_specimens(str(path), progress=lambda position, total: calls.append(position))
+
+    assert calls[:-1] and all(position is None for position in calls[:-1])
+    assert calls[-1] == path.stat().st_size
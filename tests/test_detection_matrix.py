@@ -0,0 +1,31 @@
+import csv
+
+from conftest import SAMPLE_REPORT
+from parse_lab_results import main
+
+PANEL = ['Adenovirus', 'Influenza A', 'RSV']
+
+
+def read_columns(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return next(csv.reader(file))
+
+
+def test_matrix_columns_follow_the_panel_rather_than_the_run(tmp_path):
+    targets = tmp_path / 'panel.txt'
+    targets.write_text('\n'.join(PANEL) + '\n')
+    output = tmp_path / 'matrix.csv'
+
+    assert main([SAMPLE_REPORT, '--matrix', '--targets', str(targets), '-o', str(output)]) == 0
+    # Adenovirus is on the panel but detected in no specimen of the sample report
+    assert read_columns(output)[4:] == PANEL
+
+
+def test_grammar_panel_sets_the_matrix_columns(tmp_path):
+    grammar = tmp_path / 'grammar.json'
+    grammar.write_text('{"specimen": ["SPEC #:", "Specimen:"], "fields": {"run_date": {"markers": ["RUN DATE:"]}}, '
+                       '"panel": ["RSV", "Adenovirus"]}')
+    output = tmp_path / 'matrix.csv'
+
+    assert main([SAMPLE_REPORT, '--matrix', '--grammar', str(grammar), '-o', str(output)]) == 0
+    assert read_columns(output)[4:] == ['RSV', 'Adenovirus']
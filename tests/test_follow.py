@@ -0,0 +1,51 @@
+import csv
+import os
+import shutil
+import time
+
+from conftest import SAMPLE_REPORT
+from parse_lab_results import follow_lab_records, main
+
+
+def make_old(path):
+    # As if the LIS finished writing the report an hour ago
+    stale = time.time() - 3600
+    os.utime(path, (stale, stale))
+
+
+def followed_ids(report, state, **kwargs):
+    return [record['sample_id'] for records in follow_lab_records(report, state, once=True, **kwargs)
+            for record in records]
+
+
+def test_finished_report_yields_every_specimen(tmp_path):
+    report = str(tmp_path / 'report.txt')
+    shutil.copy(SAMPLE_REPORT, report)
+    make_old(report)
+
+    assert followed_ids(report, str(tmp_path / 'state.json')) == ['S2025001', 'S2025002', 'S2025003']
+    # Nothing is replayed from the end-of-file checkpoint
+    assert followed_ids(report, str(tmp_path / 'state.json')) == []
+
+
+def test_last_specimen_waits_for_the_report_to_settle(tmp_path):
+    report = str(tmp_path / 'report.txt')
+    shutil.copy(SAMPLE_REPORT, report)
+    state = str(tmp_path / 'state.json')
+
+    assert followed_ids(report, state, settle=3600) == ['S2025001', 'S2025002']
+    assert followed_ids(report, state, settle=3600, final=True) == ['S2025003']
+
+
+def test_follow_once_writes_single_specimen_report(tmp_path):
+    report = tmp_path / 'single.txt'
+    report.write_text("RUN DATE: 01/15/25\nSPEC #: S1\nAGE/SEX: 45/M\nCOMP: 01/15/25-1130\n"
+                      "Influenza A                        Final\n                                   Detected\n")
+    make_old(str(report))
+    output = tmp_path / 'out.csv'
+
+    assert main([str(report), '--follow', '--once', '-o', str(output)]) == 0
+    with open(output, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['Sample ID #'] for row in rows] == ['S1']
+    assert rows[0]['Result'] == 'Influenza A: Detected'
@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import SAMPLE_REPORT
+from lab_export import RESULT_COLUMNS, export_results
+from lab_parser import parse_lab_results
+
+pd = pytest.importorskip('pandas')
+
+FORMATS = {
+    'csv': lambda path: pd.read_csv(path, dtype=str, keep_default_na=False),
+    'xlsx': lambda path: pd.read_excel(path, dtype=str, keep_default_na=False),
+    'parquet': pd.read_parquet,
+    'arrow': pd.read_feather,
+}
+# What each format needs beyond pandas to be written and read back
+DEPENDENCIES = {'csv': [], 'xlsx': ['openpyxl'], 'parquet': ['pyarrow'], 'arrow': ['pyarrow']}
+
+
+def read_back(tmp_path, format, rows):
+    for module in DEPENDENCIES[format]:
+        pytest.importorskip(module)
+    path = str(tmp_path / f'results.{format}')
+    count = export_results(iter(rows), path, format)
+    return count, FORMATS[format](path)
+
+
+@pytest.mark.parametrize('format', sorted(FORMATS))
+def test_writers_keep_the_columns_in_order_with_the_sample_rows(tmp_path, format):
+    rows = parse_lab_results(SAMPLE_REPORT)
+    count, frame = read_back(tmp_path, format, rows)
+
+    assert count == len(rows) == 3
+    assert list(frame.columns) == RESULT_COLUMNS
+    assert frame.to_dict('records') == rows
+
+
+@pytest.mark.parametrize('format', sorted(FORMATS))
+def test_empty_results_still_write_the_header(tmp_path, format):
+    count, frame = read_back(tmp_path, format, [])
+
+    assert count == 0
+    assert list(frame.columns) == RESULT_COLUMNS
+    assert len(frame) == 0
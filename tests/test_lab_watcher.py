@@ -0,0 +1,75 @@
+import asyncio
+import csv
+import os
+import shutil
+
+from conftest import SAMPLE_REPORT
+from lab_parser import parse_specimens
+from lab_watcher import CsvSink, DropFolderWatcher, StoreSink
+from specimen_store import SpecimenStore
+
+
+async def wait_for(condition, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out waiting for the watcher"
+        await asyncio.sleep(0.05)
+
+
+def test_report_changed_after_processing_is_not_stored_twice(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    report = inbox / 'report.txt'
+    store_path = str(tmp_path / 'store.db')
+
+    async def scenario():
+        watcher = DropFolderWatcher([str(inbox)], StoreSink(store_path), str(tmp_path / 'state.json'),
+                                    interval=0.05, settle=0)
+        task = asyncio.create_task(watcher.run())
+        shutil.copy(SAMPLE_REPORT, report)
+        await wait_for(lambda: watcher.metrics.files_processed == 1)
+
+        # The analyzer appends to the report after it was processed
+        with open(report, 'a', encoding='utf-8') as file:
+            file.write('\n')
+        await wait_for(lambda: watcher.metrics.files_processed == 2)
+        watcher.stop()
+        await task
+        return watcher
+
+    watcher = asyncio.run(scenario())
+    assert watcher.metrics.files_failed == 0
+    with SpecimenStore(store_path) as store:
+        assert store.specimens() == parse_specimens(str(report))
+
+
+def test_report_changed_after_processing_is_not_appended_to_the_csv_twice(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    report = inbox / 'report.txt'
+    output = tmp_path / 'out.csv'
+
+    async def scenario():
+        watcher = DropFolderWatcher([str(inbox)], CsvSink(str(output)), str(tmp_path / 'state.json'),
+                                    interval=0.05, settle=0)
+        task = asyncio.create_task(watcher.run())
+        shutil.copy(SAMPLE_REPORT, report)
+        await wait_for(lambda: watcher.metrics.files_processed == 1)
+
+        # Touched without new content, then appended to by the analyzer
+        stat = os.stat(report)
+        os.utime(report, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        await wait_for(lambda: watcher.metrics.files_processed == 2)
+        with open(report, 'a', encoding='utf-8') as file:
+            file.write("\nSPEC #: S2025004\nAGE/SEX: 33/F\n")
+        await wait_for(lambda: watcher.metrics.files_processed == 3)
+        watcher.stop()
+        await task
+        return watcher
+
+    watcher = asyncio.run(scenario())
+    assert watcher.metrics.files_failed == 0
+    with open(output, newline='', encoding='utf-8') as file:
+        sample_ids = [row['Sample ID #'] for row in csv.DictReader(file)]
+    assert sample_ids == ['S2025001', 'S2025002', 'S2025003', 'S2025004']
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+import parse_cache
+from conftest import SAMPLE_REPORT
+from lab_parser import parse_specimens
+from parse_cache import ParseCache
+
+
+def copy_sample(tmp_path, name='report.txt'):
+    path = tmp_path / name
+    shutil.copy(SAMPLE_REPORT, path)
+    return str(path)
+
+
+def cache_file(cache, path):
+    specimens_data = parse_specimens(path)
+    cache.put(path, specimens_data)
+    cache.save()
+    return specimens_data
+
+
+def touch(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_unchanged_file_is_served_without_hashing_it(tmp_path, monkeypatch):
+    path = copy_sample(tmp_path)
+    expected = cache_file(ParseCache(str(tmp_path / 'cache'), 1), path)
+
+    def fail(file_path):
+        raise AssertionError("an unchanged file was hashed")
+
+    monkeypatch.setattr(parse_cache, 'file_digest', fail)
+    assert ParseCache(str(tmp_path / 'cache'), 1).get(path) == expected
+
+
+def test_file_with_only_a_new_mtime_is_served_by_its_hash(tmp_path):
+    path = copy_sample(tmp_path)
+    expected = cache_file(ParseCache(str(tmp_path / 'cache'), 1), path)
+    touch(path)
+
+    assert ParseCache(str(tmp_path / 'cache'), 1).get(path) == expected
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    path = copy_sample(tmp_path)
+    cache_file(ParseCache(str(tmp_path / 'cache'), 1), path)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write("\nSPEC #: S2025004\n")
+    touch(path)
+
+    assert ParseCache(str(tmp_path / 'cache'), 1).get(path) is None
+
+
+def test_new_parser_version_clears_the_cache(tmp_path):
+    path = copy_sample(tmp_path)
+    cache_file(ParseCache(str(tmp_path / 'cache'), 1), path)
+
+    cache = ParseCache(str(tmp_path / 'cache'), 2)
+    assert cache.get(path) is None
+    assert cache.index['blobs'] == {}
+    assert [name for name in os.listdir(tmp_path / 'cache') if name != ParseCache.INDEX_NAME] == []
+
+
+def test_least_recently_used_results_are_evicted_first(tmp_path):
+    paths = [copy_sample(tmp_path, 'first.txt'), copy_sample(tmp_path, 'second.txt'), copy_sample(tmp_path, 'third.txt')]
+    # Distinct content, so each file has its own cached result
+    for number, path in enumerate(paths):
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(f"\nSPEC #: EXTRA{number}\n")
+
+    cache = ParseCache(str(tmp_path / 'cache'), 1)
+    for path in paths[:2]:
+        cache_file(cache, path)
+    blob_bytes = max(blob['bytes'] for blob in cache.index['blobs'].values())
+    cache.max_bytes = blob_bytes * 2
+    # Using the first result makes the second the least recently used
+    assert cache.get(paths[0]) is not None
+    cache_file(cache, paths[2])
+
+    cache = ParseCache(str(tmp_path / 'cache'), 1)
+    assert cache.get(paths[0]) is not None
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[2]) is not None
@@ -0,0 +1,133 @@
+import random
+import re
+
+import pytest
+
+from lab_parser import (iter_lab_records, merge_specimen, merge_specimens, parse_chunk, parse_lab_results,
+                        read_new_records, specimens_to_results, split_offsets)
+from report_grammar import BIOFIRE_GRAMMAR, ReportGrammar
+
+# Pieces random reports are built from: markers, fields, test lines, long filler and line endings
+PIECES = [
+    'SPEC #: ', 'Specimen:', 'SPEC #:\n\n', 'RUN DATE: ', 'AGE/SEX: ', 'COMP: ', 'Final', '\n', ' ', 'Detected',
+    'Not Detected', '---Test Final', 'Influenza A   Final\n   Detected\n', 'RSV Final\n Not Detected\n', 'x' * 300,
+    'S1', 'S2', 'S3', '01/15/25', '45/M', '\n\n', 'Spec', 'RUN DATE:', '\nSPEC #: A1\n', '\nSpecimen: A2 ',
+    '\r\nSPEC #: A3', '\nSPEC #:\nSPEC #: Z', 'é', '\xa0', '\r',
+]
+REPORTS = 300
+
+
+def baseline_parse(file_path):
+    """The parser as it was before the single-pass section engine, kept as the reference."""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        content = file.read()
+
+    specimens_data = {}
+    for match in re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content):
+        sample_id = match.group(1)
+        start_pos = match.start()
+        if sample_id not in specimens_data:
+            specimens_data[sample_id] = {'run_date': "Unknown", 'age_sex': "Unknown", 'comp_date_time': "Unknown",
+                                         'detected_tests': []}
+
+        section_end = len(content)
+        for other_match in re.finditer(r'(?:SPEC #:|Specimen:)\s*(\S+)', content[start_pos + 1:]):
+            section_end = start_pos + 1 + other_match.start()
+            break
+        section = content[start_pos:section_end]
+
+        run_date_match = re.search(r'RUN DATE:\s*(\S+)', content[max(0, start_pos - 1000):start_pos])
+        if not run_date_match:
+            run_date_match = re.search(r'RUN DATE:\s*(\S+)', section)
+        if run_date_match and specimens_data[sample_id]['run_date'] == "Unknown":
+            specimens_data[sample_id]['run_date'] = run_date_match.group(1)
+
+        age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', content[max(0, start_pos - 1000):start_pos])
+        if not age_sex_match:
+            age_sex_match = re.search(r'AGE/SEX:\s*(\S+)', section)
+        if age_sex_match and specimens_data[sample_id]['age_sex'] == "Unknown":
+            specimens_data[sample_id]['age_sex'] = age_sex_match.group(1)
+
+        comp_match = re.search(r'COMP:\s*(\S+)', section)
+        if comp_match and specimens_data[sample_id]['comp_date_time'] == "Unknown":
+            specimens_data[sample_id]['comp_date_time'] = comp_match.group(1)
+
+        lines = section.split('\n')
+        for i in range(len(lines) - 1):
+            line = lines[i].strip()
+            if "Final" in line and not line.startswith("---"):
+                test_name = line.split("Final")[0].strip()
+                result_line = lines[i + 1].strip() if i + 1 < len(lines) else ""
+                if "Detected" in result_line and "Not Detected" not in result_line:
+                    specimens_data[sample_id]['detected_tests'].append(test_name)
+
+    return [
+        {
+            "Date": data['run_date'],
+            "Sample ID #": sample_id,
+            "Age": data['age_sex'],
+            "COMP DATE-Time": data['comp_date_time'],
+            "Result": "Not detected" if not data['detected_tests']
+            else "; ".join(f"{test}: Detected" for test in data['detected_tests']),
+        }
+        for sample_id, data in specimens_data.items()
+    ]
+
+
+def random_reports(seed):
+    rng = random.Random(seed)
+    for _ in range(REPORTS):
+        yield ''.join(rng.choice(PIECES) for _ in range(rng.randint(0, 200)))
+
+
+def parse_streamed(file_path):
+    # A tiny chunk size puts chunk edges inside markers, values and test lines
+    specimens_data = {}
+    for record in iter_lab_records(file_path, chunk_size=7):
+        merge_specimen(specimens_data, record)
+    return specimens_to_results(specimens_data)
+
+
+def parse_split(file_path):
+    specimens_data = {}
+    offsets = split_offsets(file_path, 5)
+    for start, end in zip(offsets, offsets[1:]):
+        merge_specimens(specimens_data, parse_chunk(file_path, start, end))
+    return specimens_to_results(specimens_data)
+
+
+def parse_followed(file_path):
+    # The report is written a few pieces at a time, as the LIS does, and read after each write
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    edges = sorted(random.Random(len(data)).sample(range(len(data) + 1), min(4, len(data) + 1)))
+    specimens_data = {}
+    checkpoint = 0
+    with open(file_path, 'wb') as file:
+        for edge in edges + [len(data)]:
+            file.seek(0, 2)
+            file.write(data[file.tell():edge])
+            file.flush()
+            records, checkpoint = read_new_records(file_path, checkpoint, final=edge == len(data))
+            for record in records:
+                merge_specimen(specimens_data, record)
+    return specimens_to_results(specimens_data)
+
+
+PARSERS = {
+    'stream': parse_lab_results,
+    'mmap': lambda file_path: parse_lab_results(file_path, backend='mmap'),
+    'chunked': parse_streamed,
+    'split': parse_split,
+    'follow': parse_followed,
+    'grammar': lambda file_path: parse_lab_results(file_path, grammar=ReportGrammar(BIOFIRE_GRAMMAR)),
+}
+
+
+@pytest.mark.parametrize('name', sorted(PARSERS))
+def test_parsers_match_the_baseline(name, tmp_path):
+    path = tmp_path / 'report.txt'
+    for text in random_reports(name):
+        path.write_bytes(text.encode('utf-8'))
+        expected = baseline_parse(str(path))
+        assert PARSERS[name](str(path)) == expected, text
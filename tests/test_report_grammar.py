@@ -0,0 +1,27 @@
+import pytest
+
+from report_grammar import ReportGrammar, load_grammar
+
+
+@pytest.mark.parametrize('spec', [
+    ['SPEC #:'],
+    {'name': 'No specimen marker'},
+    {'specimen': 'SPEC #:'},
+    {'specimen': ['SPEC #:'], 'fields': {'run_date': 'RUN DATE:'}},
+    {'specimen': [5]},
+    {'specimen': ['SPEC #:'], 'header_lookbehind': 'x'},
+    {'specimen': ['SPEC #:'], 'tests': {'status': 5}},
+    {'specimen': ['SPEC #:'], 'fields': {'run_date': {'markers': ['RUN DATE:'], 'value': '('}}},
+    {'specimen': ['SPEC #:'], 'fields': {'run_date': {'markers': ['RUN DATE:'], 'value': '(?i)\\S+'}}},
+])
+def test_malformed_grammars_are_refused_with_a_value_error(spec):
+    with pytest.raises(ValueError):
+        ReportGrammar(spec)
+
+
+def test_yaml_syntax_error_is_a_value_error(tmp_path):
+    pytest.importorskip('yaml')
+    path = tmp_path / 'grammar.yaml'
+    path.write_text("specimen: [SPEC #:\n  - fields: [\n")
+    with pytest.raises(ValueError):
+        load_grammar(str(path))
@@ -0,0 +1,56 @@
+import os
+
+from lab_parser import iter_lab_records, merge_specimens, parse_specimens
+from specimen_shards import ShardedSpecimens
+
+REPORTS = [
+    "RUN DATE: 01/15/25\nSPEC #: S1\nAGE/SEX: Unknown\n"
+    "Influenza A                        Final\n                                   Detected\n"
+    "SPEC #: S2\nAGE/SEX: 30/F\nCOMP: 01/15/25-1130\n",
+    "RUN DATE: 01/16/25\nSPEC #: S3\nAGE/SEX: 52/M\n"
+    "SPEC #: S1\nAGE/SEX: 45/M\n"
+    "RSV                                Final\n                                   Detected\n",
+]
+
+
+def write_reports(tmp_path):
+    paths = []
+    for number, text in enumerate(REPORTS):
+        path = tmp_path / f'report{number}.txt'
+        path.write_text(text)
+        paths.append(str(path))
+    return paths
+
+
+def test_sharded_records_merge_like_merge_specimens(tmp_path):
+    paths = write_reports(tmp_path)
+    expected = {}
+    for path in paths:
+        merge_specimens(expected, parse_specimens(path))
+
+    for shards in (1, 3):
+        with ShardedSpecimens(shards) as sharded:
+            for path in paths:
+                sharded.add_records(iter_lab_records(path))
+            assert list(sharded.items()) == list(expected.items())
+            assert len(sharded) == len(expected)
+
+
+def test_writers_adopted_in_order_after_a_discarded_part(tmp_path):
+    paths = write_reports(tmp_path)
+    with ShardedSpecimens(4) as sharded:
+        writers = [sharded.writer() for _ in paths + ['failed']]
+        # Filled out of order, as worker processes would
+        for writer, path in reversed(list(zip(writers, paths))):
+            writer.add_records(iter_lab_records(path))
+            writer.flush()
+        writers[2].add(parse_specimens(paths[0]))
+        writers[2].flush()
+        writers[2].discard()
+        for writer in writers:
+            sharded.adopt(writer)
+
+        expected = parse_specimens(paths[0])
+        merge_specimens(expected, parse_specimens(paths[1]))
+        assert list(sharded.items()) == list(expected.items())
+        assert not any('part' in name for name in os.listdir(sharded.directory))
@@ -0,0 +1,62 @@
+import shutil
+
+from conftest import SAMPLE_REPORT
+from lab_parser import parse_specimens
+import specimen_store
+from specimen_store import SpecimenStore
+
+
+def add_file(store, path):
+    store.add(parse_specimens(path), path)
+
+
+def test_readding_a_modified_file_replaces_its_contribution(tmp_path):
+    report = tmp_path / 'report.txt'
+    shutil.copy(SAMPLE_REPORT, report)
+    expected = parse_specimens(str(report))
+
+    with SpecimenStore(str(tmp_path / 'store.db')) as store:
+        add_file(store, str(report))
+        # The LIS appends to the report, so it is no longer the file that was stored
+        with open(report, 'a', encoding='utf-8') as file:
+            file.write('\n')
+        assert not store.contains_file(str(report))
+        add_file(store, str(report))
+
+        assert store.specimens() == expected
+        assert store.get('S2025001').detected_tests == expected['S2025001'].detected_tests
+
+
+def test_specimens_dropped_from_an_edited_file_are_merged_again(tmp_path):
+    first, second = tmp_path / 'first.txt', tmp_path / 'second.txt'
+    first.write_text("RUN DATE: 01/15/25\nSPEC #: S1\nAGE/SEX: Unknown\n"
+                     "Influenza A                        Final\n                                   Detected\n"
+                     "SPEC #: S2\nAGE/SEX: 30/F\n")
+    second.write_text("RUN DATE: 01/16/25\nSPEC #: S1\nAGE/SEX: 45/M\n"
+                      "RSV                                Final\n                                   Detected\n")
+
+    with SpecimenStore(str(tmp_path / 'store.db')) as store:
+        add_file(store, str(first))
+        add_file(store, str(second))
+        s1 = store.get('S1')
+        assert (s1.run_date, s1.age_sex, s1.detected_tests) == ('01/15/25', '45/M', ['Influenza A', 'RSV'])
+
+        # The first file loses S1's result and S2 altogether; S1 keeps its place and second.txt's data
+        first.write_text("RUN DATE: 01/15/25\nSPEC #: S1\nAGE/SEX: Unknown\n")
+        add_file(store, str(first))
+        assert list(store.specimens()) == ['S1']
+        assert store.get('S1').detected_tests == ['RSV']
+        assert store.get('S2') is None
+
+
+def test_add_reuses_the_digest_contains_file_computed(tmp_path, monkeypatch):
+    report = tmp_path / 'report.txt'
+    shutil.copy(SAMPLE_REPORT, report)
+    hashed = []
+    monkeypatch.setattr(specimen_store, 'file_digest', lambda path: hashed.append(path) or 'digest')
+
+    with SpecimenStore(str(tmp_path / 'store.db')) as store:
+        assert not store.contains_file(str(report))
+        add_file(store, str(report))
+
+    assert hashed == [str(report)]